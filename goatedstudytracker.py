@@ -4,10 +4,31 @@ import csv
 from datetime import datetime
 import os
 import json
+import hashlib
+import argparse
+import html
+import re
+import base64
+import io
+import zlib
+import locale
+import mmap
+import struct
+from array import array
+import bisect
+import time
+from collections import OrderedDict
 from PyQt5 import QtMultimedia
+from PyQt5 import QtNetwork
 
 FILE_NAME = os.path.join(os.path.expanduser("~"), "study_log.csv")
 JOURNAL_FILE = os.path.join(os.path.expanduser("~"), "journal_entries.csv")
+SESSION_HEADER = ["Date", "Time", "Subject", "Notes", "XP", "Time Studied (min)"]
+JOURNAL_HEADER = ["Date", "Time", "Content", "Attachments", "Title"]
+# Same encoding open() uses for the data files by default
+DATA_ENCODING = locale.getpreferredencoding(False)
+# Journal entries with embedded images easily pass csv's 128 KiB default; 2**31 - 1 still fits a C long on Windows
+csv.field_size_limit(2**31 - 1)
 
 PASTEL_DARK_BG = "#23243a"
 PASTEL_DARK_PANEL = "#2d2e4a"
@@ -19,8 +40,103 @@ PASTEL_YELLOW = "#fff5ba"
 PASTEL_TEXT = "#e6e6e6"
 PASTEL_OUTLINE = "#4e4e6e"
 
+# Each theme fills the same stylesheet template. "on_tone" is text drawn on the pastel
+# buttons, "highlight" and "positive" are accent and green when used as text colours.
+THEMES = {
+    "Pastel Dark": {
+        "bg": PASTEL_DARK_BG, "panel": PASTEL_DARK_PANEL, "text": PASTEL_TEXT, "outline": PASTEL_OUTLINE,
+        "accent": PASTEL_ACCENT, "green": PASTEL_GREEN, "red": PASTEL_RED, "purple": PASTEL_PURPLE, "yellow": PASTEL_YELLOW,
+        "on_tone": PASTEL_DARK_BG, "highlight": PASTEL_ACCENT, "positive": PASTEL_GREEN,
+    },
+    "Pastel Light": {
+        "bg": "#f7f5fb", "panel": "#ebe8f5", "text": "#2d2e4a", "outline": "#c8c4de",
+        "accent": PASTEL_ACCENT, "green": PASTEL_GREEN, "red": PASTEL_RED, "purple": PASTEL_PURPLE, "yellow": PASTEL_YELLOW,
+        "on_tone": PASTEL_DARK_BG, "highlight": "#5b7bd5", "positive": "#3f8f80",
+    },
+}
+DEFAULT_THEME = "Pastel Dark"
+
+# One application-wide stylesheet. Widgets opt into a look through objectName or the
+# "tone" (button colour) and "variant" (button padding/font) dynamic properties.
+THEME_TEMPLATE = """
+QWidget {{ background-color: {bg}; color: {text}; }}
+QTabWidget::pane {{ background: {bg}; }}
+QTabBar::tab {{ background: {panel}; color: {text}; border-radius: 8px; padding: 8px 24px; font-size: 15px; min-width: 120px; min-height: 32px; }}
+QTabBar::tab:selected {{ background: {accent}; color: {on_tone}; }}
+QPushButton[tone] {{ color: {on_tone}; font-weight: bold; border-radius: 6px; }}
+QPushButton[tone="accent"] {{ background: {accent}; }}
+QPushButton[tone="green"] {{ background: {green}; }}
+QPushButton[tone="red"] {{ background: {red}; }}
+QPushButton[tone="purple"] {{ background: {purple}; }}
+QPushButton[tone="yellow"] {{ background: {yellow}; }}
+QPushButton[variant="normal"] {{ padding: 6px 16px; }}
+QPushButton[variant="large"] {{ padding: 6px 16px; font-size: 15px; }}
+QPushButton[variant="wide"] {{ padding: 6px 24px; font-size: 15px; }}
+QPushButton[variant="timer"] {{ padding: 6px 24px; font-size: 16px; }}
+QPushButton[variant="text"] {{ font-size: 15px; }}
+QPushButton#settingsButton {{ background: transparent; color: {highlight}; font-size: 22px; }}
+QProgressBar {{ background: {panel}; border-radius: 8px; }}
+QProgressBar::chunk {{ background: {green}; border-radius: 8px; }}
+QGroupBox {{ background: {panel}; border-radius: 8px; }}
+QGroupBox#timerGroup {{ font-size: 18px; color: {text}; margin-top: 0px; }}
+QGroupBox#settingsSection {{ margin-top: 12px; border: none; }}
+QTableWidget {{ background: {panel}; color: {text}; border-radius: 8px; }}
+QHeaderView::section {{ background: {accent}; color: {on_tone}; font-weight: bold; }}
+QTreeWidget {{ background: {panel}; color: {text}; border-radius: 8px; font-size: 15px; }}
+QTreeWidget::item {{ border: 1px solid {outline}; border-radius: 6px; margin: 4px; padding: 6px; }}
+QTreeWidget::item:selected {{ background: {accent}; color: {on_tone}; border: 2px solid {outline}; }}
+QToolBar {{ background: {panel}; border-radius: 8px; }}
+QToolButton {{ font-size: 15px; min-width: 32px; min-height: 32px; padding: 4px 10px; }}
+QTextEdit#journalEditor {{ background: {bg}; color: {text}; border-radius: 8px; font-size: 15px; }}
+QLabel#attachmentLabel {{ color: {positive}; font-size: 13px; }}
+QLabel#timerTitle {{ color: {highlight}; margin-bottom: 8px; }}
+QLabel#timerLabel {{ color: {highlight}; }}
+QLabel#alarmLabel {{ color: {positive}; font-size: 15px; }}
+QSpinBox#breakSpin {{ background: {bg}; color: {text}; font-size: 16px; }}
+QLabel#settingName {{ color: {text}; font-size: 15px; padding-right: 8px; }}
+QLineEdit#settingValue, QComboBox#settingValue {{ background: {bg}; color: {positive}; font-size: 15px; border: none; padding: 6px 8px; border-radius: 6px; }}
+"""
+
 CONFIG_FILE = os.path.join(os.path.expanduser("~"), "goatedstudytracker_config.json")
 
+# Records arriving over the local socket are held this long so a burst lands in one write
+INGEST_FLUSH_MS = 250
+CLI_COMMANDS = ("log", "journal", "verify", "profile-ui")
+
+# Prepared journal documents kept around so flipping between recent entries skips the parse
+JOURNAL_DOC_CACHE_SIZE = 12
+
+# Unsaved journal text is logged after this much idle time, and never later than the max delay
+DRAFT_IDLE_MS = 1000
+DRAFT_MAX_DELAY_MS = 5000
+# Deltas logged before the draft log is rewritten as a single snapshot
+DRAFT_COMPACT_DELTAS = 200
+# Blocks encoded per write when a compacted base goes to disk
+DRAFT_WRITE_SLICE = 200
+
+# Notes longer than this stay on disk and are read through the offset index when a row is opened
+NOTES_PREVIEW_CHARS = 120
+SESSION_INDEX_MAGIC = b"GSTIDX1\0"
+# Index header after the magic: log size, log mtime_ns, record count
+SESSION_INDEX_HEADER = struct.Struct("<QQQ")
+# Rows parsed per memory-mapped slice when loading through a fresh index
+SESSION_PAGE_ROWS = 4096
+
+DEFAULT_SUBJECTS = ["Physics", "Chemistry", "Biology"]
+SUBJECT_CATALOG_VERSION = 2
+# A subject's usage weight halves over this period when ranking the dropdown
+SUBJECT_USAGE_HALF_LIFE = 14 * 24 * 3600
+
+# Integrity checksums cover runs of whole records of at least this many bytes
+INTEGRITY_BLOCK_SIZE = 64 * 1024
+INTEGRITY_VERSION = 1
+
+UNSAFE_HTML_RE = re.compile(r"<(script|iframe|object|embed)\b.*?</\1\s*>|<(?:script|iframe|object|embed)\b[^>]*>", re.I | re.S)
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+EVENT_ATTR_RE = re.compile(r"\son\w+\s*=\s*(\"[^\"]*\"|'[^']*'|[^\s>]+)", re.I)
+IMG_SRC_RE = re.compile(r"<img\b[^>]*?\bsrc\s*=\s*[\"']([^\"']+)[\"']", re.I)
+SPLIT_SPAN_RE = re.compile(r'(<span style="([^"]*)">[^<]*)</span><span style="\2">')
+
 def get_default_data_dir():
     return os.path.expanduser("~")
 
@@ -34,6 +150,881 @@ def save_config(config):
     with open(CONFIG_FILE, "w") as f:
         json.dump(config, f)
 
+THEME_CACHE = {}
+
+def theme_stylesheet(name):
+    # Formatted once per theme; switching back and forth reuses the same string
+    if name not in THEME_CACHE:
+        THEME_CACHE[name] = THEME_TEMPLATE.format(**THEMES[name])
+    return THEME_CACHE[name]
+
+def style_button(button, tone, variant=None):
+    button.setProperty("tone", tone)
+    if variant:
+        button.setProperty("variant", variant)
+    return button
+
+def instance_key(data_dir):
+    # Server name is per data folder, so two folders can each have their own running app
+    path = os.path.normcase(os.path.abspath(data_dir))
+    return "goatedstudytracker-" + hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+
+def instance_lock_path(data_dir):
+    return os.path.join(data_dir, ".goatedstudytracker.lock")
+
+def ingest_int(record, key):
+    # Only real JSON integers: int() would truncate 1.9, and 1e999 parses to inf and overflows
+    value = record[key]
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"{key} must be a whole number")
+    return value
+
+def send_ingest_records(data_dir, records, timeout=3000):
+    # Returns one reply per record, or None if no app is listening for this data folder
+    sock = QtNetwork.QLocalSocket()
+    sock.connectToServer(instance_key(data_dir))
+    if not sock.waitForConnected(timeout):
+        return None
+    for record in records:
+        sock.write((json.dumps(record) + "\n").encode("utf-8"))
+    sock.flush()
+    replies = []
+    while len(replies) < len(records):
+        if not sock.canReadLine() and not sock.waitForReadyRead(timeout):
+            break
+        while sock.canReadLine():
+            replies.append(json.loads(bytes(sock.readLine()).decode("utf-8")))
+    sock.disconnectFromServer()
+    return replies
+
+def write_json_atomic(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def csv_record_bytes(row):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(row)
+    return buf.getvalue().encode(DATA_ENCODING)
+
+def csv_still_quoted(line, quoted):
+    # Whether a record is still inside a quoted field after this line. As in csv.reader, a quote
+    # only opens a field as its first character; anywhere else it is just text
+    pos = 0
+    if not quoted and line.startswith(b'"'):
+        quoted, pos = True, 1
+    while True:
+        if quoted:
+            close = line.find(b'"', pos)
+            if close == -1:
+                return True
+            if line.startswith(b'"', close + 1):
+                pos = close + 2
+                continue
+            quoted, pos = False, close + 1
+        comma = line.find(b",", pos)
+        if comma == -1:
+            return False
+        pos = comma + 1
+        if line.startswith(b'"', pos):
+            quoted, pos = True, pos + 1
+
+def iter_csv_records(file, offset=0):
+    # Yields (offset, raw bytes) for each record; a newline only ends a record outside quotes
+    file.seek(offset)
+    parts, quoted = [], False
+    for line in file:
+        if not parts and b'"' not in line:
+            yield offset, line
+            offset += len(line)
+            continue
+        parts.append(line)
+        quoted = csv_still_quoted(line, quoted)
+        if not quoted:
+            record = b"".join(parts)
+            yield offset, record
+            offset += len(record)
+            parts = []
+    if parts:
+        yield offset, b"".join(parts)
+
+def parse_csv_record(raw):
+    if b'"' not in raw:
+        # Nothing quoted, so the fields are plain comma-separated text
+        return raw.decode(DATA_ENCODING).rstrip("\r\n").split(",")
+    rows = list(csv.reader(io.StringIO(raw.decode(DATA_ENCODING), newline="")))
+    if len(rows) != 1:
+        raise ValueError("not a single CSV record")
+    return rows[0]
+
+def parse_session_record(raw):
+    # XP and minutes are checked integers, so they split off the end; when date, time and subject
+    # are plain that leaves the notes as one field to unquote, with no CSV state machine
+    parts = raw.rstrip(b"\r\n").rsplit(b",", 2)
+    if len(parts) != 3 or b'"' in parts[1] or b'"' in parts[2]:
+        return parse_csv_record(raw)
+    head, xp, minutes = parts
+    quote = head.find(b'"')
+    if quote == -1:
+        row = head.decode(DATA_ENCODING).split(",")
+    elif head.count(b",", 0, quote) == 3 and head.endswith(b'"'):
+        row = head[:quote - 1].decode(DATA_ENCODING).split(",")
+        row.append(head[quote + 1:-1].decode(DATA_ENCODING).replace('""', '"'))
+    else:
+        return parse_csv_record(raw)
+    if len(row) != 4:
+        return parse_csv_record(raw)
+    row.append(xp.decode(DATA_ENCODING))
+    row.append(minutes.decode(DATA_ENCODING))
+    return row
+
+def check_session_row(row):
+    if len(row) != len(SESSION_HEADER):
+        return f"expected {len(SESSION_HEADER)} fields, found {len(row)}"
+    try:
+        datetime.strptime(row[0], "%Y-%m-%d")
+        int(row[4])
+        int(row[5])
+    except ValueError as e:
+        return str(e)
+    return None
+
+def check_journal_row(row):
+    if len(row) not in (4, 5):
+        return f"expected 4 or 5 fields, found {len(row)}"
+    try:
+        datetime.strptime(row[0], "%Y-%m-%d")
+    except ValueError as e:
+        return str(e)
+    return None
+
+def classify_csv_record(start, raw, headers, check_row):
+    if csv_still_quoted(raw, False):
+        return "bad", "unterminated quoted field"
+    try:
+        row = parse_csv_record(raw)
+    except (ValueError, csv.Error) as e:
+        return "bad", str(e)
+    if start == 0 and row in headers:
+        return "header", None
+    reason = check_row(row)
+    return "bad" if reason else "row", reason
+
+def classify_csv_records(file, offset, headers, check_row):
+    # Yields (offset, raw, kind, reason) where kind is "header", "row" or "bad"
+    while True:
+        for start, raw in iter_csv_records(file, offset):
+            kind, reason = classify_csv_record(start, raw, headers, check_row)
+            cut = raw.find(b"\n") + 1
+            if kind == "bad" and 0 < cut < len(raw):
+                # A stray opening quote would drag every following line into this record,
+                # so give up only its first line and rescan from the next
+                yield start, raw[:cut], kind, reason
+                offset = start + cut
+                break
+            yield start, raw, kind, reason
+        else:
+            return
+
+def data_file_specs(data_dir):
+    # (path, accepted headers, row check) for each file the integrity check covers
+    return [(os.path.join(data_dir, "study_log.csv"), [SESSION_HEADER], check_session_row),
+            (os.path.join(data_dir, "journal_entries.csv"), [JOURNAL_HEADER, JOURNAL_HEADER[:4]], check_journal_row)]
+
+class IntegrityBlocks:
+    # Groups consecutive records into checksummed blocks of [start, length, crc32, rows]
+    def __init__(self, blocks, offset):
+        self.blocks = blocks
+        self.start, self.length, self.crc, self.rows = offset, 0, 0, 0
+
+    def add(self, raw, is_row):
+        self.length += len(raw)
+        self.crc = zlib.crc32(raw, self.crc)
+        self.rows += 1 if is_row else 0
+        if self.length >= INTEGRITY_BLOCK_SIZE:
+            self.close()
+
+    def close(self):
+        if self.length:
+            self.blocks.append([self.start, self.length, self.crc, self.rows])
+        self.start, self.length, self.crc, self.rows = self.start + self.length, 0, 0, 0
+        return self.blocks
+
+def load_integrity_blocks(sidecar):
+    try:
+        with open(sidecar, "r") as f:
+            state = json.load(f)
+        if state.get("version") == INTEGRITY_VERSION and state.get("block_size") == INTEGRITY_BLOCK_SIZE:
+            return state["blocks"]
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+    return []
+
+def file_crc(file, start, length):
+    file.seek(start)
+    crc = 0
+    while length > 0:
+        chunk = file.read(min(length, 1024 * 1024))
+        if not chunk:
+            return None
+        crc = zlib.crc32(chunk, crc)
+        length -= len(chunk)
+    return crc
+
+def verify_data_file(path, headers, check_row, repair=True):
+    """Stream-check a data CSV, moving malformed records to a recovery file when repairing.
+
+    Blocks whose checksum still matches the sidecar from the last clean check are not parsed again.
+    """
+    report = {"path": path, "rows": 0, "bad": 0, "problems": [], "checked_bytes": 0, "skipped_bytes": 0, "repaired": False, "recovery_file": None}
+    if not os.path.exists(path):
+        return report
+    sidecar = path + ".integrity"
+    with open(path, "rb") as file:
+        trusted = []
+        offset = 0
+        for block in load_integrity_blocks(sidecar):
+            start, length, crc, rows = block
+            if start != offset or file_crc(file, start, length) != crc:
+                break
+            trusted.append(block)
+            offset += length
+        # Reopen a short trailing block so appended records fold into it instead of piling up small blocks
+        if trusted and trusted[-1][1] < INTEGRITY_BLOCK_SIZE:
+            offset -= trusted.pop()[1]
+        report["skipped_bytes"] = offset
+        report["rows"] = sum(block[3] for block in trusted)
+        has_header = offset > 0
+        unterminated = False
+        blocks = IntegrityBlocks(list(trusted), offset)
+        for start, raw, kind, reason in classify_csv_records(file, offset, headers, check_row):
+            report["checked_bytes"] += len(raw)
+            unterminated = not raw.endswith(b"\n")
+            if kind == "header":
+                has_header = True
+            elif kind == "row":
+                report["rows"] += 1
+            else:
+                report["bad"] += 1
+                if len(report["problems"]) < 20:
+                    report["problems"].append((start, reason))
+            blocks.add(raw, kind == "row")
+        if not report["bad"] and has_header and not unterminated:
+            write_json_atomic(sidecar, {"version": INTEGRITY_VERSION, "block_size": INTEGRITY_BLOCK_SIZE, "blocks": blocks.close()})
+            return report
+        if not repair:
+            return report
+        # Second pass: copy the trusted prefix and every good record into a fresh file, then swap it in
+        root, ext = os.path.splitext(path)
+        recovery_path = root + ".recovered" + ext
+        tmp = path + ".tmp"
+        recovery = None
+        try:
+            with open(tmp, "wb") as out:
+                blocks = IntegrityBlocks(list(trusted), offset)
+                if not has_header:
+                    # Only possible with nothing trusted, so the new header lands at offset 0
+                    raw = csv_record_bytes(headers[0])
+                    out.write(raw)
+                    blocks.add(raw, False)
+                remaining = offset
+                file.seek(0)
+                while remaining > 0:
+                    chunk = file.read(min(remaining, 1024 * 1024))
+                    out.write(chunk)
+                    remaining -= len(chunk)
+                for start, raw, kind, reason in classify_csv_records(file, offset, headers, check_row):
+                    if not raw.endswith(b"\n"):
+                        raw += b"\r\n"
+                    if kind == "bad":
+                        if recovery is None:
+                            recovery = open(recovery_path, "ab")
+                        recovery.write(raw)
+                        continue
+                    out.write(raw)
+                    blocks.add(raw, kind == "row")
+                out.flush()
+                os.fsync(out.fileno())
+        finally:
+            if recovery is not None:
+                recovery.close()
+    os.replace(tmp, path)
+    write_json_atomic(sidecar, {"version": INTEGRITY_VERSION, "block_size": INTEGRITY_BLOCK_SIZE, "blocks": blocks.close()})
+    report["repaired"] = True
+    report["recovery_file"] = recovery_path if recovery is not None else None
+    return report
+
+def sanitize_journal_html(content):
+    content = UNSAFE_HTML_RE.sub("", content)
+    return HTML_TAG_RE.sub(lambda m: EVENT_ATTR_RE.sub("", m.group(0)), content)
+
+def load_journal_image(src):
+    if src.startswith("data:"):
+        header, _, payload = src.partition(",")
+        try:
+            raw = base64.b64decode(payload) if header.endswith(";base64") else payload.encode("utf-8")
+        except ValueError:
+            return None
+        image = QtGui.QImage.fromData(raw)
+    else:
+        url = QtCore.QUrl(src)
+        path = url.toLocalFile() if url.isLocalFile() else src
+        if not os.path.isfile(path):
+            return None
+        image = QtGui.QImage(path)
+    return None if image.isNull() else image
+
+class JournalDocumentCache:
+    # LRU of prepared QTextDocuments and their draft shadows keyed by entry; a hit only counts if the
+    # entry's content is unchanged
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.docs = OrderedDict()
+
+    def get(self, entry):
+        cached = self.docs.get(entry)
+        if cached is None or cached[0] is not entry.content:
+            return None
+        self.docs.move_to_end(entry)
+        return cached[1], cached[2]
+
+    def put(self, entry, content, doc, shadow):
+        self.docs[entry] = (content, doc, shadow)
+        self.docs.move_to_end(entry)
+        while len(self.docs) > self.capacity:
+            self.docs.popitem(last=False)
+
+    def discard(self, entry):
+        self.docs.pop(entry, None)
+
+class JournalDocumentSignals(QtCore.QObject):
+    ready = QtCore.pyqtSignal(object, object, object, object)
+
+class JournalDocumentJob(QtCore.QRunnable):
+    # Sanitizes, resolves images and lays out a journal entry on a pool thread
+    def __init__(self, entry, font, width, signals):
+        super().__init__()
+        self.entry = entry
+        self.content = entry.content
+        self.font = QtGui.QFont(font)
+        self.width = width
+        self.signals = signals
+        self.gui_thread = signals.thread()
+
+    def run(self):
+        doc = QtGui.QTextDocument()
+        doc.setDefaultFont(self.font)
+        content = sanitize_journal_html(self.content)
+        for src in set(IMG_SRC_RE.findall(content)):
+            image = load_journal_image(src)
+            if image is not None:
+                doc.addResource(QtGui.QTextDocument.ImageResource, QtCore.QUrl(src), image)
+        doc.setHtml(content)
+        # Lay out at the editor's width up front; Qt still lays out the rest of very long
+        # multi-paragraph documents incrementally once they are shown
+        if self.width > 0:
+            doc.setTextWidth(self.width)
+        doc.documentLayout().documentSize()
+        # The draft shadow: what replaying a draft log based on this content gives, parsed here
+        # so autosave never has to parse the entry on the GUI thread
+        shadow = QtGui.QTextDocument()
+        shadow.setDefaultFont(self.font)
+        shadow.setHtml(content)
+        doc.moveToThread(self.gui_thread)
+        shadow.moveToThread(self.gui_thread)
+        self.signals.ready.emit(self.entry, self.content, doc, shadow)
+
+def format_to_text(fmt):
+    data = QtCore.QByteArray()
+    QtCore.QDataStream(data, QtCore.QIODevice.WriteOnly) << fmt
+    return base64.b64encode(bytes(data)).decode("ascii")
+
+def format_from_text(text):
+    fmt = QtGui.QTextFormat()
+    QtCore.QDataStream(QtCore.QByteArray(base64.b64decode(text))) >> fmt
+    return fmt
+
+def draft_delta_blocks(doc, start, end):
+    # The text in [start, end) as one entry per block: its formats, its list, and its runs of
+    # text with their char formats. Formats go through QDataStream, which keeps what Qt's HTML
+    # fragments drop (list items, formats of empty paragraphs, leading whitespace).
+    blocks = []
+    # Serialized formats by their index in the document, since most runs share a handful
+    char_formats = {}
+    block_formats = {}
+    block = doc.findBlock(start)
+    while True:
+        runs = []
+        it = block.begin()
+        while not it.atEnd():
+            fragment = it.fragment()
+            it += 1
+            position = fragment.position()
+            low = max(position, start)
+            high = min(position + fragment.length(), end)
+            if low < high:
+                index = fragment.charFormatIndex()
+                if index not in char_formats:
+                    char_formats[index] = format_to_text(fragment.charFormat())
+                runs.append([fragment.text()[low - position:high - position], char_formats[index]])
+        # Lists are found again by how far back the previous item is. A first item carries the list's
+        # format and how far ahead its first item past the range is, bisected out of the items.
+        text_list = block.textList()
+        if text_list is None:
+            list_ref = None
+        elif text_list.itemNumber(block) > 0:
+            list_ref = {"back": block.blockNumber() - text_list.item(text_list.itemNumber(block) - 1).blockNumber()}
+        else:
+            low, high = 1, text_list.count()
+            while low < high:
+                middle = (low + high) // 2
+                if text_list.item(middle).position() > end:
+                    high = middle
+                else:
+                    low = middle + 1
+            following = text_list.item(low).blockNumber() - block.blockNumber() if low < text_list.count() else 0
+            list_ref = {"format": format_to_text(text_list.format()), "next": following}
+        index = block.blockFormatIndex()
+        if index not in block_formats:
+            # The object index points at this document's list objects, so it is left out
+            block_format = block.blockFormat()
+            block_format.clearProperty(QtGui.QTextFormat.ObjectIndex)
+            block_formats[index] = format_to_text(block_format)
+        index = block.charFormatIndex()
+        if index not in char_formats:
+            char_formats[index] = format_to_text(block.charFormat())
+        blocks.append({"block": block_formats[block.blockFormatIndex()], "char": char_formats[index], "list": list_ref, "runs": runs})
+        # Carry on past the paragraph break only if it is inside the range
+        if block.position() + block.length() - 1 >= end:
+            return blocks
+        block = block.next()
+
+def apply_draft_delta(doc, position, removed, blocks):
+    formats = {}
+    def decoded(text):
+        if text not in formats:
+            formats[text] = format_from_text(text)
+        return formats[text]
+    end = doc.characterCount() - 1
+    cursor = QtGui.QTextCursor(doc)
+    cursor.setPosition(min(position, end))
+    cursor.setPosition(min(position + removed, end), QtGui.QTextCursor.KeepAnchor)
+    cursor.removeSelectedText()
+    first = cursor.position()
+    for i, entry in enumerate(blocks):
+        if i:
+            cursor.insertBlock()
+        for text, fmt in entry["runs"]:
+            cursor.insertText(text, decoded(fmt).toCharFormat())
+    # Formats and lists go on once every block exists, so list references can reach across them
+    block = doc.findBlock(first)
+    for entry in blocks:
+        cursor = QtGui.QTextCursor(block)
+        block_format = decoded(entry["block"]).toBlockFormat()
+        list_ref = entry["list"]
+        target = None
+        if list_ref is not None and "back" in list_ref:
+            target = doc.findBlockByNumber(block.blockNumber() - list_ref["back"]).textList()
+        elif list_ref is not None and list_ref["next"]:
+            target = doc.findBlockByNumber(block.blockNumber() + list_ref["next"]).textList()
+            if target is not None:
+                target.setFormat(decoded(list_ref["format"]).toListFormat())
+        # The object index puts the block in its list; without one it leaves any list it was in
+        if target is not None:
+            block_format.setObjectIndex(target.objectIndex())
+        cursor.setBlockFormat(block_format)
+        cursor.setBlockCharFormat(decoded(entry["char"]).toCharFormat())
+        if list_ref is not None and target is None and "format" in list_ref:
+            cursor.createList(decoded(list_ref["format"]).toListFormat())
+        block = block.next()
+
+def draft_block_key(block, formats):
+    # Everything a delta records about a whole block, with formats serialized once per index into formats
+    runs = []
+    it = block.begin()
+    while not it.atEnd():
+        fragment = it.fragment()
+        it += 1
+        index = fragment.charFormatIndex()
+        if index not in formats:
+            formats[index] = format_to_text(fragment.charFormat())
+        # Qt may split a run into several fragments of the same format
+        if runs and runs[-1][1] == formats[index]:
+            runs[-1][0] += fragment.text()
+        else:
+            runs.append([fragment.text(), formats[index]])
+    text, list_index = draft_block_format(block, formats)
+    key = [runs, text]
+    index = block.charFormatIndex()
+    if index not in formats:
+        formats[index] = format_to_text(block.charFormat())
+    key.append(formats[index])
+    if list_index >= 0:
+        index = ("list", list_index)
+        if index not in formats:
+            formats[index] = format_to_text(block.textList().format())
+        # itemNumber searches the whole list, so skip it when the item just above is in the same one
+        above = block.previous()
+        if above.isValid() and draft_block_format(above, formats)[1] == list_index:
+            back = 1
+        else:
+            text_list = block.textList()
+            number = text_list.itemNumber(block)
+            back = block.blockNumber() - text_list.item(number - 1).blockNumber() if number else None
+        key.append([formats[index], back])
+    return key
+
+def draft_block_format(block, formats):
+    # The block's format, serialized without its object index, and that index: its list's, or -1
+    index = ("block", block.blockFormatIndex())
+    if index not in formats:
+        block_format = block.blockFormat()
+        list_index = block_format.objectIndex()
+        block_format.clearProperty(QtGui.QTextFormat.ObjectIndex)
+        formats[index] = (format_to_text(block_format), list_index)
+    return formats[index]
+
+def trim_draft_span(doc, shadow, start, end, removed):
+    # Qt reports every item of a list as changed when one joins or leaves it, so whole blocks at either
+    # end of the span that match the shadow's are dropped, leaving just the edit
+    formats = {}
+    shadow_formats = {}
+    block = doc.findBlock(start)
+    old = shadow.findBlock(start)
+    while block.position() + block.length() <= end and old.position() + old.length() <= start + removed:
+        if draft_block_key(block, formats) != draft_block_key(old, shadow_formats):
+            break
+        removed -= block.position() + block.length() - start
+        start = block.position() + block.length()
+        block = block.next()
+        old = old.next()
+    # Past the span the two only differ by how far the edit moved the text
+    shift = end - start - removed
+    matched = False
+    while end > start:
+        block = doc.findBlock(end - 1)
+        old = shadow.findBlock(block.position() - shift)
+        if block.position() < start or old.position() != block.position() - shift or old.position() < start:
+            break
+        # The paragraph break ending a block holds the next block's char format, so that has to match too
+        if not matched and block.next().isValid() and draft_block_key(block.next(), formats) != draft_block_key(old.next(), shadow_formats):
+            break
+        matched = True
+        if draft_block_key(block, formats) != draft_block_key(old, shadow_formats):
+            break
+        removed = old.position() - start
+        end = block.position()
+    return start, end, removed
+
+def draft_region(doc, start, end):
+    # The blocks covering [start, end] plus one neighbour each side, so paragraph formats are compared
+    # too: their HTML, and where each sits in its list, which the HTML can't show past the region
+    first = doc.findBlock(start)
+    last = doc.findBlock(end)
+    if first.previous().isValid():
+        first = first.previous()
+    if last.next().isValid():
+        last = last.next()
+    lists = []
+    block = first
+    while True:
+        text_list = block.textList()
+        lists.append(None if text_list is None else (text_list.itemNumber(block), text_list.count()))
+        if block == last:
+            break
+        block = block.next()
+    cursor = QtGui.QTextCursor(doc)
+    cursor.setPosition(first.position())
+    cursor.setPosition(last.position() + last.length() - 1, QtGui.QTextCursor.KeepAnchor)
+    html = cursor.selection().toHtml()
+    # Runs whose formats differ only in properties HTML doesn't carry export as twin spans
+    while True:
+        html, merged = SPLIT_SPAN_RE.subn(r"\1", html)
+        if not merged:
+            return html, lists
+
+class DraftLog:
+    # Write-ahead log for the journal editor: one base snapshot followed by small replace-range deltas.
+    # Only the draft pool's thread touches it while the app runs.
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def append(self, position, removed, blocks):
+        self.write({"op": "delta", "pos": position, "removed": removed, "blocks": blocks})
+
+    def write(self, record):
+        self.file.write((json.dumps(record) + "\n").encode("utf-8"))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def compact(self, html=None, blocks=None):
+        # Swap in a base-only log atomically so a crash mid-compaction keeps the old one.
+        # The base is HTML, or blocks as in a delta when it comes from a document already loaded.
+        self.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            if blocks is None:
+                f.write((json.dumps({"op": "base", "html": html}) + "\n").encode("utf-8"))
+            else:
+                # A slice at a time, so the GUI thread gets the interpreter back between them
+                f.write(b'{"op": "base", "blocks": [')
+                for i in range(0, len(blocks), DRAFT_WRITE_SLICE):
+                    if i:
+                        f.write(b", ")
+                    f.write(json.dumps(blocks[i:i + DRAFT_WRITE_SLICE])[1:-1].encode("utf-8"))
+                f.write(b"]}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.file = open(self.path, "ab")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def replay(self, doc):
+        # Rebuild the draft into doc; a torn last line from a crash just ends the replay
+        if not os.path.exists(self.path):
+            return False
+        has_base = False
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get("op") == "base":
+                    if "blocks" in record:
+                        doc.clear()
+                        apply_draft_delta(doc, 0, 0, record["blocks"])
+                    else:
+                        doc.setHtml(record["html"])
+                    has_base = True
+                elif has_base and record.get("op") == "delta":
+                    apply_draft_delta(doc, record["pos"], record["removed"], record["blocks"])
+        return has_base and not doc.isEmpty()
+
+class DraftShadowSignals(QtCore.QObject):
+    ready = QtCore.pyqtSignal(object, object)
+
+class DraftShadowJob(QtCore.QRunnable):
+    # Rewrites the draft log as a single base on the draft pool's thread and hands back the shadow
+    # document replaying it gives. The shadow is taken over from doc or, without one, replayed from
+    # the log as it stands.
+    def __init__(self, log, session, doc, font, signals):
+        super().__init__()
+        self.log = log
+        self.session = session
+        self.doc = doc
+        self.font = QtGui.QFont(font)
+        self.signals = signals
+        self.gui_thread = signals.thread()
+
+    def run(self):
+        doc = self.doc
+        if doc is not None:
+            doc.moveToThread(QtCore.QThread.currentThread())
+        else:
+            doc = QtGui.QTextDocument()
+            doc.setDefaultFont(self.font)
+            self.log.replay(doc)
+        if doc.rootFrame().childFrames():
+            # Tables don't fit in blocks; replay starts from setHtml(html), so the shadow has to as well
+            html = doc.toHtml()
+            doc.setHtml(html)
+            self.log.compact(html=html)
+        else:
+            # Blocks replay to exactly this document, where an HTML round trip would drift from the editor's
+            self.log.compact(blocks=draft_delta_blocks(doc, 0, doc.characterCount() - 1))
+        doc.moveToThread(self.gui_thread)
+        self.signals.ready.emit(self.session, doc)
+
+class SubjectCatalog:
+    # Subjects with stable ids. Renaming keeps the old name as an alias, so logged rows
+    # that still say the old name resolve to the same subject without being rewritten.
+    def __init__(self, subjects=(), next_id=1):
+        self.subjects = {}
+        self.by_key = {}
+        # (casefolded name, id) kept sorted; backs the type-ahead completer
+        self.sorted_keys = []
+        self.next_id = next_id
+        self.migrated = False
+        for record in subjects:
+            self.subjects[record["id"]] = record
+            for name in [record["name"]] + record["aliases"]:
+                self.by_key[name.casefold()] = record["id"]
+            self.sorted_keys.append((record["name"].casefold(), record["id"]))
+        self.sorted_keys.sort()
+
+    @classmethod
+    def from_json(cls, state):
+        if isinstance(state, list):
+            # Plain list of names from before the catalog existed
+            catalog = cls()
+            for name in state:
+                catalog.add(name)
+            catalog.migrated = True
+            return catalog
+        return cls(state["subjects"], state["next_id"])
+
+    def to_json(self):
+        return {"version": SUBJECT_CATALOG_VERSION, "next_id": self.next_id, "subjects": list(self.subjects.values())}
+
+    def find(self, name):
+        return self.subjects.get(self.by_key.get(name.strip().casefold()))
+
+    def display_name(self, name):
+        record = self.find(name)
+        return record["name"] if record else name
+
+    def add(self, name):
+        name = name.strip()
+        record = self.find(name)
+        if record is not None:
+            return record
+        record = {"id": self.next_id, "name": name, "aliases": [], "score": 0.0, "last_used": 0}
+        self.next_id += 1
+        self.subjects[record["id"]] = record
+        self.by_key[name.casefold()] = record["id"]
+        bisect.insort(self.sorted_keys, (name.casefold(), record["id"]))
+        return record
+
+    def rename(self, subject_id, new_name):
+        new_name = new_name.strip()
+        record = self.subjects[subject_id]
+        other = self.find(new_name)
+        if other is not None and other is not record:
+            raise ValueError(f'"{other["name"]}" already uses that name.')
+        old_key = (record["name"].casefold(), subject_id)
+        del self.sorted_keys[bisect.bisect_left(self.sorted_keys, old_key)]
+        if record["name"].casefold() != new_name.casefold():
+            record["aliases"].append(record["name"])
+        record["aliases"] = [a for a in record["aliases"] if a.casefold() != new_name.casefold()]
+        record["name"] = new_name
+        self.by_key[new_name.casefold()] = subject_id
+        bisect.insort(self.sorted_keys, (new_name.casefold(), subject_id))
+        return record
+
+    def record_use(self, name, when=None):
+        when = time.time() if when is None else when
+        record = self.add(name)
+        record["score"] = self.rank(record, when) + 1.0
+        record["last_used"] = max(record["last_used"], when)
+        return record
+
+    def rank(self, record, now):
+        # Frequency decayed by recency, so both how often and how lately count
+        return record["score"] * 0.5 ** (max(now - record["last_used"], 0) / SUBJECT_USAGE_HALF_LIFE)
+
+    def ranked_names(self):
+        now = time.time()
+        records = sorted(self.subjects.values(), key=lambda r: (-self.rank(r, now), r["name"].casefold()))
+        return [r["name"] for r in records]
+
+    def sorted_names(self):
+        return [self.subjects[subject_id]["name"] for _, subject_id in self.sorted_keys]
+
+class SessionRow(list):
+    # A study_log.csv row as held in memory. sid is its record number in the file;
+    # long notes are cut to a preview and read back through the offset index on demand.
+    __slots__ = ("sid", "notes_cut")
+
+    def __init__(self, row, sid):
+        super().__init__(row)
+        self.sid = sid
+        self.notes_cut = len(row) > 3 and len(row[3]) > NOTES_PREVIEW_CHARS
+        if self.notes_cut:
+            self[3] = row[3][:NOTES_PREVIEW_CHARS] + "\u2026"
+
+class SessionIndex:
+    # Sidecar of byte offsets into study_log.csv, one per data record, so any row or page
+    # of rows can be sliced out of a memory map without parsing the rest of the file
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.path = csv_path + ".idx"
+        self.offsets = array("Q")
+        self.size = 0
+
+    def header(self):
+        stat = os.stat(self.csv_path)
+        return SESSION_INDEX_MAGIC + SESSION_INDEX_HEADER.pack(stat.st_size, stat.st_mtime_ns, len(self.offsets))
+
+    def load(self):
+        # Read the offsets from the sidecar; False when it is missing, damaged, or stale because
+        # the log's size or mtime moved without the index being told
+        stat = os.stat(self.csv_path)
+        try:
+            with open(self.path, "rb") as f:
+                stored = f.read(len(SESSION_INDEX_MAGIC) + SESSION_INDEX_HEADER.size)
+                if len(stored) != len(SESSION_INDEX_MAGIC) + SESSION_INDEX_HEADER.size or not stored.startswith(SESSION_INDEX_MAGIC):
+                    return False
+                size, mtime_ns, count = SESSION_INDEX_HEADER.unpack_from(stored, len(SESSION_INDEX_MAGIC))
+                if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                    return False
+                offsets = array("Q")
+                offsets.fromfile(f, count)
+        except (OSError, EOFError):
+            return False
+        if count and (offsets[0] == 0 or offsets[-1] >= size):
+            return False
+        self.offsets = offsets
+        self.size = size
+        return True
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.header())
+            self.offsets.tofile(f)
+        os.replace(tmp, self.path)
+
+    def append(self, records):
+        # Extend the index for records just appended to the log; the header goes last so a
+        # crash in between leaves an index that reads as stale and gets rebuilt
+        first = len(self.offsets)
+        for raw in records:
+            self.offsets.append(self.size)
+            self.size += len(raw)
+        try:
+            with open(self.path, "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                self.offsets[first:].tofile(f)
+                f.seek(0)
+                f.write(self.header())
+        except OSError:
+            self.save()
+        return range(first, len(self.offsets))
+
+    def span(self, sid):
+        end = self.offsets[sid + 1] if sid + 1 < len(self.offsets) else self.size
+        return self.offsets[sid], end
+
+    def read_rows(self, start, count, parse=parse_csv_record):
+        stop = min(start + count, len(self.offsets))
+        if start >= stop:
+            return []
+        first, last = self.offsets[start], self.span(stop - 1)[1]
+        with open(self.csv_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            chunk = mapped[first:last]
+        rows = []
+        for sid in range(start, stop):
+            begin, end = self.span(sid)
+            rows.append(parse(chunk[begin - first:end - first]))
+        return rows
+
+    def read_row(self, sid):
+        return self.read_rows(sid, 1)[0]
+
 class JournalEntry:
     def __init__(self, date, time, content, attachments, title=None):
         self.date = date
@@ -43,21 +1034,35 @@ class JournalEntry:
         self.title = title if title else f"{date} {time}"
 
 class StudyTrackerApp(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, data_dir=None):
         super().__init__()
         self.setWindowTitle("📘 Goated Study Tracker")
         self.setGeometry(100, 100, 1100, 750)
-        self.setStyleSheet(f"background-color: {PASTEL_DARK_BG}; color: {PASTEL_TEXT};")
-        self.data_dir = self.get_or_choose_data_dir()
+        self.apply_theme((load_config() or {}).get("theme", DEFAULT_THEME))
+        self.data_dir = data_dir or self.get_or_choose_data_dir()
+        if not self.acquire_instance_lock():
+            sys.exit(0)
         self.FILE_NAME = os.path.join(self.data_dir, "study_log.csv")
         self.JOURNAL_FILE = os.path.join(self.data_dir, "journal_entries.csv")
         self.SUBJECTS_FILE = os.path.join(self.data_dir, "subjects.json")
-        self.subjects = self.load_subjects()
+        self.check_data_files()
+        self.subject_catalog = self.load_subjects()
         self.data = self.load_data()
+        if self.subject_catalog.migrated:
+            self.seed_subject_usage()
         self.journal_entries = self.load_journal()
         self.init_ui()
         self.refresh_log()
         self.refresh_journal_list()
+        self.restore_journal_draft()
+        self.start_ingest_server()
+
+    def apply_theme(self, name):
+        # Restyles every open widget in place; nothing is rebuilt
+        if name not in THEMES:
+            name = DEFAULT_THEME
+        self.theme_name = name
+        QtWidgets.QApplication.instance().setStyleSheet(theme_stylesheet(name))
 
     def get_or_choose_data_dir(self):
         config = load_config()
@@ -82,25 +1087,92 @@ class StudyTrackerApp(QtWidgets.QWidget):
             save_config({"data_dir": folder})
             QtWidgets.QMessageBox.information(self, "Restart Required", "Please restart the app to use the new data folder.")
 
-    def load_subjects(self):
-        default_subjects = ["Physics", "Chemistry", "Biology"]
-        if os.path.exists(self.SUBJECTS_FILE):
+    def acquire_instance_lock(self):
+        # Only one app may own a data folder; a second launch raises the first window and exits
+        self.instance_lock = QtCore.QLockFile(instance_lock_path(self.data_dir))
+        # Stale only if the owning process is gone, never by age
+        self.instance_lock.setStaleLockTime(0)
+        if self.instance_lock.tryLock(100):
+            return True
+        if send_ingest_records(self.data_dir, [{"type": "activate"}]) is None:
+            QtWidgets.QMessageBox.warning(self, "Already Running", f"Goated Study Tracker is already running for this data folder:\n{self.data_dir}")
+        return False
+
+    def closeEvent(self, event):
+        self.flush_ingest_queue()
+        # Keep the draft log on disk so the text comes back on the next launch
+        self.flush_journal_draft()
+        self.draft_pool.waitForDone()
+        if self.draft_span is not None:
+            # Still waiting on the shadow, so snapshot what the editor shows directly
+            self.journal_draft.compact(html=self.journal_shown_doc.toHtml())
+        self.journal_draft.close()
+        self.instance_lock.unlock()
+        super().closeEvent(event)
+
+    def check_data_files(self):
+        # Quarantine rows the loaders below would choke on before anything reads the files
+        repaired = []
+        for path, headers, check_row in data_file_specs(self.data_dir):
             try:
-                with open(self.SUBJECTS_FILE, "r") as f:
-                    subjects = json.load(f)
-                if isinstance(subjects, list) and all(isinstance(s, str) for s in subjects):
-                    return subjects
-            except Exception:
-                pass
-        return default_subjects
+                report = verify_data_file(path, headers, check_row)
+            except OSError as e:
+                QtWidgets.QMessageBox.warning(self, "Data Check Failed", f"Could not check {os.path.basename(path)}: {e}")
+                continue
+            if report["bad"]:
+                repaired.append(f"{os.path.basename(path)}: moved {report['bad']} malformed row(s) to {os.path.basename(report['recovery_file'])}")
+        if repaired:
+            QtWidgets.QMessageBox.warning(self, "Data Repaired", "\n".join(repaired))
+
+    def load_subjects(self):
+        self.subjects_file_kept = False
+        if not os.path.exists(self.SUBJECTS_FILE):
+            return SubjectCatalog.from_json(DEFAULT_SUBJECTS)
+        try:
+            with open(self.SUBJECTS_FILE, "r") as f:
+                subjects = json.load(f)
+            if isinstance(subjects, list) and all(isinstance(s, str) for s in subjects):
+                return SubjectCatalog.from_json(subjects)
+            if isinstance(subjects, dict) and subjects.get("version") == SUBJECT_CATALOG_VERSION:
+                return SubjectCatalog.from_json(subjects)
+            problem = "unrecognised format"
+        except Exception as e:
+            problem = str(e) or type(e).__name__
+        # Starting over from the defaults would overwrite the aliases and usage history, so move it aside first
+        bad_path = self.SUBJECTS_FILE + ".bad"
+        try:
+            os.replace(self.SUBJECTS_FILE, bad_path)
+            message = f"Could not read {os.path.basename(self.SUBJECTS_FILE)} ({problem}).\nIt was moved to {bad_path} and the default subjects are loaded instead."
+        except OSError as e:
+            # Couldn't move it, so leave it alone rather than save over it
+            self.subjects_file_kept = True
+            message = f"Could not read {self.SUBJECTS_FILE} ({problem}) or move it aside ({e}).\nSubject changes won't be saved this session."
+        QtWidgets.QMessageBox.warning(self, "Subjects Not Loaded", message)
+        return SubjectCatalog.from_json(DEFAULT_SUBJECTS)
 
     def save_subjects(self):
+        if self.subjects_file_kept:
+            return
         try:
-            with open(self.SUBJECTS_FILE, "w") as f:
-                json.dump(self.subjects, f)
+            write_json_atomic(self.SUBJECTS_FILE, self.subject_catalog.to_json())
         except Exception:
             pass
 
+    def seed_subject_usage(self):
+        # First run on a plain subject list: rank subjects by the sessions already logged
+        for row in self.data:
+            try:
+                when = datetime.strptime(f"{row[0]} {row[1]}", "%Y-%m-%d %H:%M").timestamp()
+            except ValueError:
+                when = None
+            self.subject_catalog.record_use(row[2], when)
+        self.save_subjects()
+
+    def refresh_subject_choices(self):
+        self.subject_rank_model.setStringList(self.subject_catalog.ranked_names())
+        self.subject_completion_model.setStringList(self.subject_catalog.sorted_names())
+        self.subject_entry.setCurrentIndex(0)
+
     def add_subject_dialog(self):
         text, ok = QtWidgets.QInputDialog.getText(self, "Add Subject", "Enter new subject name:")
         if ok:
@@ -108,40 +1180,98 @@ class StudyTrackerApp(QtWidgets.QWidget):
             if not new_subject:
                 QtWidgets.QMessageBox.warning(self, "Invalid Subject", "Subject name cannot be empty.")
                 return
-            if new_subject in self.subjects:
-                QtWidgets.QMessageBox.information(self, "Duplicate Subject", f'"{new_subject}" is already in the list.')
+            existing = self.subject_catalog.find(new_subject)
+            if existing is not None:
+                QtWidgets.QMessageBox.information(self, "Duplicate Subject", f'"{existing["name"]}" is already in the list.')
                 return
-            self.subjects.append(new_subject)
-            self.subject_entry.addItem(new_subject)
-            self.subject_entry.setCurrentText(new_subject)
+            self.subject_catalog.add(new_subject)
             self.save_subjects()
+            self.refresh_subject_choices()
+            self.subject_entry.setCurrentText(new_subject)
+
+    def rename_subject_dialog(self):
+        record = self.subject_catalog.find(self.subject_entry.currentText())
+        if record is None:
+            QtWidgets.QMessageBox.warning(self, "Unknown Subject", "Pick an existing subject to rename.")
+            return
+        text, ok = QtWidgets.QInputDialog.getText(self, "Rename Subject", "New subject name:", text=record["name"])
+        if not ok or not text.strip():
+            return
+        try:
+            self.subject_catalog.rename(record["id"], text)
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Duplicate Subject", str(e))
+            return
+        self.save_subjects()
+        self.refresh_subject_choices()
+        self.subject_entry.setCurrentText(record["name"])
+        self.refresh_log()
 
     def load_data(self):
         if not os.path.exists(self.FILE_NAME):
             with open(self.FILE_NAME, "w", newline="") as file:
                 writer = csv.writer(file)
-                writer.writerow(["Date", "Time", "Subject", "Notes", "XP", "Time Studied (min)"])
+                writer.writerow(SESSION_HEADER)
+        self.session_index = SessionIndex(self.FILE_NAME)
         sessions = []
-        with open(self.FILE_NAME, "r") as file:
-            reader = csv.reader(file)
-            next(reader)
-            for row in reader:
-                sessions.append(row)
+        if self.session_index.load():
+            # Record boundaries are already known, so slice rows straight out of the log a page at a time
+            for start in range(0, len(self.session_index.offsets), SESSION_PAGE_ROWS):
+                rows = self.session_index.read_rows(start, SESSION_PAGE_ROWS, parse_session_record)
+                sessions.extend(SessionRow(row, sid) for sid, row in enumerate(rows, start))
+            return sessions
+        # Stale or missing: one streaming pass reads the rows and records every offset, then the index is rewritten
+        with open(self.FILE_NAME, "rb") as file:
+            records = iter_csv_records(file)
+            next(records, None)
+            for offset, raw in records:
+                sessions.append(SessionRow(parse_session_record(raw), len(self.session_index.offsets)))
+                self.session_index.offsets.append(offset)
+        self.session_index.size = os.path.getsize(self.FILE_NAME)
+        self.session_index.save()
         return sessions
 
     def save_data(self):
-        with open(self.FILE_NAME, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(["Date", "Time", "Subject", "Notes", "XP", "Time Studied (min)"])
-            for row in self.data:
-                writer.writerow(row)
+        # Copy each kept row's original bytes rather than re-serializing, since rows in memory
+        # may only hold a notes preview
+        tmp = self.FILE_NAME + ".tmp"
+        offsets = array("Q")
+        with open(self.FILE_NAME, "rb") as src, open(tmp, "wb") as out:
+            out.write(csv_record_bytes(SESSION_HEADER))
+            with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for sid, row in enumerate(self.data):
+                    begin, end = self.session_index.span(row.sid)
+                    raw = mapped[begin:end]
+                    if not raw.endswith(b"\n"):
+                        raw += b"\r\n"
+                    offsets.append(out.tell())
+                    out.write(raw)
+                    row.sid = sid
+            size = out.tell()
+        os.replace(tmp, self.FILE_NAME)
+        self.session_index.offsets = offsets
+        self.session_index.size = size
+        self.session_index.save()
+
+    def append_data(self, rows):
+        # Returns the rows as SessionRows numbered where they landed in the file
+        records = [csv_record_bytes(row) for row in rows]
+        with open(self.FILE_NAME, "ab") as file:
+            file.write(b"".join(records))
+        sids = self.session_index.append(records)
+        return [SessionRow(row, sid) for row, sid in zip(rows, sids)]
+
+    def session_notes(self, session):
+        if not session.notes_cut:
+            return session[3]
+        return self.session_index.read_row(session.sid)[3]
 
     def load_journal(self):
         entries = []
         if not os.path.exists(self.JOURNAL_FILE):
             with open(self.JOURNAL_FILE, "w", newline="") as file:
                 writer = csv.writer(file)
-                writer.writerow(["Date", "Time", "Content", "Attachments", "Title"])
+                writer.writerow(JOURNAL_HEADER)
         with open(self.JOURNAL_FILE, "r") as file:
             reader = csv.reader(file)
             next(reader)
@@ -158,7 +1288,7 @@ class StudyTrackerApp(QtWidgets.QWidget):
     def save_journal(self):
         with open(self.JOURNAL_FILE, "w", newline="") as file:
             writer = csv.writer(file)
-            writer.writerow(["Date", "Time", "Content", "Attachments", "Title"])
+            writer.writerow(JOURNAL_HEADER)
             for entry in self.journal_entries:
                 writer.writerow([entry.date, entry.time, entry.content, "||".join(entry.attachments), entry.title])
 
@@ -173,7 +1303,6 @@ class StudyTrackerApp(QtWidgets.QWidget):
 
     def init_ui(self):
         self.tabs = QtWidgets.QTabWidget(self)
-        self.tabs.setStyleSheet(f"QTabWidget::pane {{ background: {PASTEL_DARK_BG}; }} QTabBar::tab {{ background: {PASTEL_DARK_PANEL}; color: {PASTEL_TEXT}; border-radius: 8px; padding: 8px 24px; font-size: 15px; min-width: 120px; min-height: 32px; }} QTabBar::tab:selected {{ background: {PASTEL_ACCENT}; color: {PASTEL_DARK_BG}; }}")
         main_layout = QtWidgets.QVBoxLayout(self)
         main_layout.addWidget(self.tabs)
         # Study Tracker Tab
@@ -195,7 +1324,7 @@ class StudyTrackerApp(QtWidgets.QWidget):
             # fallback to unicode cog
             cog_btn.setText("\u2699")
         cog_btn.setFixedSize(36, 36)
-        cog_btn.setStyleSheet(f"background: transparent; color: {PASTEL_ACCENT}; font-size: 22px;")
+        cog_btn.setObjectName("settingsButton")
         cog_btn.setToolTip("Settings")
         cog_btn.clicked.connect(self.open_settings_window)
         xp_level_layout.addWidget(cog_btn)
@@ -203,23 +1332,42 @@ class StudyTrackerApp(QtWidgets.QWidget):
         # XP Progress Bar
         self.xp_bar = QtWidgets.QProgressBar()
         self.xp_bar.setFixedHeight(28)
-        self.xp_bar.setStyleSheet(f"QProgressBar {{background: {PASTEL_DARK_PANEL}; border-radius: 8px;}} QProgressBar::chunk {{background: {PASTEL_GREEN}; border-radius: 8px;}}")
         tracker_layout.addWidget(self.xp_bar)
         # Entry Form
         entry_group = QtWidgets.QGroupBox()
-        entry_group.setStyleSheet(f"QGroupBox {{background: {PASTEL_DARK_PANEL}; border-radius: 8px;}}");
         entry_layout = QtWidgets.QGridLayout(entry_group)
         entry_layout.addWidget(QtWidgets.QLabel("Subject:"), 0, 0)
+        # Dropdown ordered by usage; typing completes against the alphabetical index
         self.subject_entry = QtWidgets.QComboBox()
-        self.subject_entry.addItems(self.subjects)
+        self.subject_rank_model = QtCore.QStringListModel(self)
+        self.subject_entry.setModel(self.subject_rank_model)
+        self.subject_entry.setEditable(True)
+        self.subject_entry.setInsertPolicy(QtWidgets.QComboBox.NoInsert)
+        # Don't measure every subject to size the box
+        self.subject_entry.setSizeAdjustPolicy(QtWidgets.QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.subject_entry.setMinimumContentsLength(16)
+        self.subject_completion_model = QtCore.QStringListModel(self)
+        subject_completer = QtWidgets.QCompleter(self.subject_completion_model, self)
+        subject_completer.setCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        subject_completer.setModelSorting(QtWidgets.QCompleter.CaseInsensitivelySortedModel)
+        self.subject_entry.setCompleter(subject_completer)
+        self.refresh_subject_choices()
         entry_layout.addWidget(self.subject_entry, 0, 1)
+        subject_btn_layout = QtWidgets.QHBoxLayout()
         # Add subject button
         add_subject_btn = QtWidgets.QPushButton("+")
         add_subject_btn.setFixedWidth(28)
-        add_subject_btn.setStyleSheet(f"background: {PASTEL_ACCENT}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px;")
+        style_button(add_subject_btn, "accent")
         add_subject_btn.setToolTip("Add a new subject")
         add_subject_btn.clicked.connect(self.add_subject_dialog)
-        entry_layout.addWidget(add_subject_btn, 0, 2)
+        subject_btn_layout.addWidget(add_subject_btn)
+        rename_subject_btn = QtWidgets.QPushButton("\u270e")
+        rename_subject_btn.setFixedWidth(28)
+        style_button(rename_subject_btn, "purple")
+        rename_subject_btn.setToolTip("Rename the selected subject")
+        rename_subject_btn.clicked.connect(self.rename_subject_dialog)
+        subject_btn_layout.addWidget(rename_subject_btn)
+        entry_layout.addLayout(subject_btn_layout, 0, 2)
         entry_layout.addWidget(QtWidgets.QLabel("Notes:"), 0, 3)
         self.notes_entry = QtWidgets.QLineEdit()
         entry_layout.addWidget(self.notes_entry, 0, 4)
@@ -232,7 +1380,7 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.time_entry.setFixedWidth(60)
         entry_layout.addWidget(self.time_entry, 0, 8)
         log_btn = QtWidgets.QPushButton("Log Study")
-        log_btn.setStyleSheet(f"background: {PASTEL_GREEN}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 16px;")
+        style_button(log_btn, "green", "normal")
         log_btn.clicked.connect(self.log_study)
         entry_layout.addWidget(log_btn, 0, 9)
         tracker_layout.addWidget(entry_group)
@@ -243,7 +1391,7 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.filter_entry.textChanged.connect(self.refresh_log)
         filter_layout.addWidget(self.filter_entry)
         sort_btn = QtWidgets.QPushButton("Sort by Subject")
-        sort_btn.setStyleSheet(f"background: {PASTEL_PURPLE}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 16px;")
+        style_button(sort_btn, "purple", "normal")
         sort_btn.clicked.connect(self.sort_by_subject)
         filter_layout.addWidget(sort_btn)
         filter_layout.addStretch()
@@ -252,7 +1400,6 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.table = QtWidgets.QTableWidget()
         self.table.setColumnCount(6)
         self.table.setHorizontalHeaderLabels(["Date", "Time", "Subject", "Notes", "XP", "Time Studied (min)"])
-        self.table.setStyleSheet(f"QTableWidget {{background: {PASTEL_DARK_PANEL}; color: {PASTEL_TEXT}; border-radius: 8px;}} QHeaderView::section {{background: {PASTEL_ACCENT}; color: {PASTEL_DARK_BG}; font-weight: bold;}}")
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.table.setAlternatingRowColors(True)
@@ -263,12 +1410,12 @@ class StudyTrackerApp(QtWidgets.QWidget):
         tracker_layout.addWidget(self.table)
         # Delete Button
         del_btn = QtWidgets.QPushButton("Delete Selected")
-        del_btn.setStyleSheet(f"background: {PASTEL_RED}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 16px;")
+        style_button(del_btn, "red", "normal")
         del_btn.clicked.connect(self.delete_selected)
         tracker_layout.addWidget(del_btn)
         # Graph Button
         graph_btn = QtWidgets.QPushButton("Show Study Time Graph")
-        graph_btn.setStyleSheet(f"background: {PASTEL_YELLOW}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 16px;")
+        style_button(graph_btn, "yellow", "normal")
         graph_btn.clicked.connect(self.show_graph)
         tracker_layout.addWidget(graph_btn)
         self.tabs.addTab(tracker_widget, "Study Tracker")
@@ -278,19 +1425,11 @@ class StudyTrackerApp(QtWidgets.QWidget):
         # Calendar Tree View for Journal
         self.journal_tree = QtWidgets.QTreeWidget()
         self.journal_tree.setHeaderHidden(True)
-        self.journal_tree.setStyleSheet(
-            f"""
-            QTreeWidget {{background: {PASTEL_DARK_PANEL}; color: {PASTEL_TEXT}; border-radius: 8px; font-size: 15px;}}
-            QTreeWidget::item {{ border: 1px solid {PASTEL_OUTLINE}; border-radius: 6px; margin: 4px; padding: 6px; }}
-            QTreeWidget::item:selected {{ background: {PASTEL_ACCENT}; color: {PASTEL_DARK_BG}; border: 2px solid {PASTEL_OUTLINE}; }}
-            """
-        )
         self.journal_tree.itemSelectionChanged.connect(self.display_journal_entry)
         journal_layout.addWidget(self.journal_tree, 2)
         # Rich Text Editor + Toolbar
         editor_layout = QtWidgets.QVBoxLayout()
         self.journal_toolbar = QtWidgets.QToolBar()
-        self.journal_toolbar.setStyleSheet(f"QToolBar {{background: {PASTEL_DARK_PANEL}; border-radius: 8px;}} QToolButton {{font-size: 15px; min-width: 32px; min-height: 32px; padding: 4px 10px;}}")
         # Toolbar actions
         bold_action = QtWidgets.QAction("Bold", self)
         bold_action.setShortcut("Ctrl+B")
@@ -320,33 +1459,66 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.journal_toolbar.addWidget(size_box)
         editor_layout.addWidget(self.journal_toolbar)
         self.journal_editor = QtWidgets.QTextEdit()
-        self.journal_editor.setStyleSheet(f"background: {PASTEL_DARK_BG}; color: {PASTEL_TEXT}; border-radius: 8px; font-size: 15px;")
+        self.journal_editor.setObjectName("journalEditor")
         self.journal_editor.setFont(QtGui.QFont("Arial", 15))
         editor_layout.addWidget(self.journal_editor)
+        self.journal_docs = JournalDocumentCache(JOURNAL_DOC_CACHE_SIZE)
+        self.journal_doc_pool = QtCore.QThreadPool(self)
+        self.journal_doc_pool.setMaxThreadCount(2)
+        self.journal_doc_signals = JournalDocumentSignals(self)
+        self.journal_doc_signals.ready.connect(self.journal_document_ready)
+        self.journal_preparing = set()
+        self.journal_pending_entry = None
+        self.journal_shown_doc = self.journal_editor.document()
+        self.journal_shown_entry = None
+        self.journal_shown_revision = self.journal_shown_doc.revision()
+        self.journal_draft = DraftLog(os.path.join(self.data_dir, "journal_draft.log"))
+        # Edited range not yet logged: (start, end) in the editor now, plus its length in the log
+        self.draft_span = None
+        # What replaying the log gives right now. It comes parsed with the document, and is replayed and
+        # the log compacted on draft_pool's one thread, which also does every log write so they land in
+        # order; flushes wait while it is away.
+        self.draft_shadow = QtGui.QTextDocument()
+        self.draft_shadow.setDefaultFont(self.journal_editor.font())
+        self.draft_session = 0
+        self.draft_deltas = 0
+        # Content the log's base is written from on the first flush, None once it has been
+        self.draft_base = ""
+        self.draft_pool = QtCore.QThreadPool(self)
+        self.draft_pool.setMaxThreadCount(1)
+        self.draft_signals = DraftShadowSignals(self)
+        self.draft_signals.ready.connect(self.journal_draft_shadow_ready)
+        self.draft_idle_timer = QtCore.QTimer(self)
+        self.draft_idle_timer.setSingleShot(True)
+        self.draft_idle_timer.timeout.connect(self.flush_journal_draft)
+        self.draft_max_timer = QtCore.QTimer(self)
+        self.draft_max_timer.setSingleShot(True)
+        self.draft_max_timer.timeout.connect(self.flush_journal_draft)
+        self.journal_shown_doc.contentsChange.connect(self.journal_contents_changed)
         journal_layout.addLayout(editor_layout, 5)
         # Attachments
         attach_layout = QtWidgets.QHBoxLayout()
         self.attach_btn = QtWidgets.QPushButton("Add Attachment")
-        self.attach_btn.setStyleSheet(f"background: {PASTEL_ACCENT}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 16px; font-size: 15px;")
+        style_button(self.attach_btn, "accent", "large")
         self.attach_btn.clicked.connect(self.add_attachment)
         attach_layout.addWidget(self.attach_btn)
         self.attachment_label = QtWidgets.QLabel("")
-        self.attachment_label.setStyleSheet(f"color: {PASTEL_GREEN}; font-size: 13px;")
+        self.attachment_label.setObjectName("attachmentLabel")
         attach_layout.addWidget(self.attachment_label)
         attach_layout.addStretch()
         journal_layout.addLayout(attach_layout)
         # Save/Add/Delete/Rename Entry Buttons
         btn_layout = QtWidgets.QHBoxLayout()
         save_journal_btn = QtWidgets.QPushButton("Add Journal Entry")
-        save_journal_btn.setStyleSheet(f"background: {PASTEL_GREEN}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 16px; font-size: 15px;")
+        style_button(save_journal_btn, "green", "large")
         save_journal_btn.clicked.connect(self.add_journal_entry)
         btn_layout.addWidget(save_journal_btn)
         del_journal_btn = QtWidgets.QPushButton("Delete Entry")
-        del_journal_btn.setStyleSheet(f"background: {PASTEL_RED}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 16px; font-size: 15px;")
+        style_button(del_journal_btn, "red", "large")
         del_journal_btn.clicked.connect(self.delete_journal_entry)
         btn_layout.addWidget(del_journal_btn)
         rename_journal_btn = QtWidgets.QPushButton("Rename Entry")
-        rename_journal_btn.setStyleSheet(f"background: {PASTEL_PURPLE}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 16px; font-size: 15px;")
+        style_button(rename_journal_btn, "purple", "large")
         rename_journal_btn.clicked.connect(self.rename_journal_entry)
         btn_layout.addWidget(rename_journal_btn)
         btn_layout.addStretch()
@@ -359,11 +1531,11 @@ class StudyTrackerApp(QtWidgets.QWidget):
         # Title label above group
         timer_title = QtWidgets.QLabel("Break Timer")
         timer_title.setFont(QtGui.QFont("Arial", 22, QtGui.QFont.Bold))
-        timer_title.setStyleSheet(f"color: {PASTEL_ACCENT}; margin-bottom: 8px;")
+        timer_title.setObjectName("timerTitle")
         timer_title.setAlignment(QtCore.Qt.AlignCenter)
         break_layout.addWidget(timer_title)
         timer_group = QtWidgets.QGroupBox()
-        timer_group.setStyleSheet(f"QGroupBox {{background: {PASTEL_DARK_PANEL}; border-radius: 8px; font-size: 18px; color: {PASTEL_TEXT}; margin-top: 0px;}}")
+        timer_group.setObjectName("timerGroup")
         timer_layout = QtWidgets.QGridLayout(timer_group)
         # Time input row (minutes and seconds)
         timer_layout.addWidget(QtWidgets.QLabel("Set break duration:"), 0, 0)
@@ -371,13 +1543,13 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.break_minutes = QtWidgets.QSpinBox()
         self.break_minutes.setRange(0, 180)
         self.break_minutes.setValue(5)
-        self.break_minutes.setStyleSheet(f"background: {PASTEL_DARK_BG}; color: {PASTEL_TEXT}; font-size: 16px;")
+        self.break_minutes.setObjectName("breakSpin")
         time_input_layout.addWidget(self.break_minutes)
         time_input_layout.addWidget(QtWidgets.QLabel("min"))
         self.break_seconds = QtWidgets.QSpinBox()
         self.break_seconds.setRange(0, 59)
         self.break_seconds.setValue(0)
-        self.break_seconds.setStyleSheet(f"background: {PASTEL_DARK_BG}; color: {PASTEL_TEXT}; font-size: 16px;")
+        self.break_seconds.setObjectName("breakSpin")
         time_input_layout.addWidget(self.break_seconds)
         time_input_layout.addWidget(QtWidgets.QLabel("sec"))
         time_input_layout.addStretch()
@@ -386,20 +1558,20 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.timer_label = QtWidgets.QLabel("00:00")
         self.timer_label.setFont(QtGui.QFont("Arial", 36, QtGui.QFont.Bold))
         self.timer_label.setAlignment(QtCore.Qt.AlignCenter)
-        self.timer_label.setStyleSheet(f"color: {PASTEL_ACCENT};")
+        self.timer_label.setObjectName("timerLabel")
         timer_layout.addWidget(self.timer_label, 1, 0, 1, 2)
         # Start/Stop/Reset buttons
         btn_layout = QtWidgets.QHBoxLayout()
         self.start_btn = QtWidgets.QPushButton("Start")
-        self.start_btn.setStyleSheet(f"background: {PASTEL_GREEN}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 24px; font-size: 16px;")
+        style_button(self.start_btn, "green", "timer")
         self.start_btn.clicked.connect(self.start_break_timer)
         btn_layout.addWidget(self.start_btn)
         self.stop_btn = QtWidgets.QPushButton("Stop")
-        self.stop_btn.setStyleSheet(f"background: {PASTEL_RED}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 24px; font-size: 16px;")
+        style_button(self.stop_btn, "red", "timer")
         self.stop_btn.clicked.connect(self.stop_break_timer)
         btn_layout.addWidget(self.stop_btn)
         self.reset_btn = QtWidgets.QPushButton("Reset")
-        self.reset_btn.setStyleSheet(f"background: {PASTEL_PURPLE}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; padding: 6px 24px; font-size: 16px;")
+        style_button(self.reset_btn, "purple", "timer")
         self.reset_btn.clicked.connect(self.reset_break_timer)
         btn_layout.addWidget(self.reset_btn)
         timer_layout.addLayout(btn_layout, 2, 0, 1, 2)
@@ -409,10 +1581,10 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.alarm_path = self.get_alarm_path()
         alarm_basename = os.path.basename(self.alarm_path) if self.alarm_path else "(System Beep)"
         self.alarm_label = QtWidgets.QLabel(alarm_basename)
-        self.alarm_label.setStyleSheet(f"color: {PASTEL_GREEN}; font-size: 15px;")
+        self.alarm_label.setObjectName("alarmLabel")
         alarm_layout.addWidget(self.alarm_label)
         choose_alarm_btn = QtWidgets.QPushButton("Choose Sound")
-        choose_alarm_btn.setStyleSheet(f"background: {PASTEL_ACCENT}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; font-size: 15px;")
+        style_button(choose_alarm_btn, "accent", "text")
         choose_alarm_btn.clicked.connect(self.choose_alarm_sound)
         alarm_layout.addWidget(choose_alarm_btn)
         alarm_layout.addStretch()
@@ -427,6 +1599,7 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.setLayout(main_layout)
         self.update_xp_display()
         self.current_attachments = []
+        self.notes_dialog = None
 
         self.menu_bar = QtWidgets.QMenuBar(self)
         settings_menu = self.menu_bar.addMenu("Settings")
@@ -533,7 +1706,7 @@ class StudyTrackerApp(QtWidgets.QWidget):
             self.break_alarm_player.play()
 
     def log_study(self):
-        subject = self.subject_entry.currentText()
+        subject = self.subject_entry.currentText().strip()
         notes = self.notes_entry.text().strip()
         try:
             xp = int(self.xp_entry.text())
@@ -545,6 +1718,9 @@ class StudyTrackerApp(QtWidgets.QWidget):
             QtWidgets.QMessageBox.warning(self, "Missing Subject", "Please enter a subject.")
             return
         now = datetime.now()
+        # Typed names match existing subjects case-insensitively; new ones join the catalog
+        subject = self.subject_catalog.record_use(subject, now.timestamp())["name"]
+        self.save_subjects()
         session = [
             now.strftime("%Y-%m-%d"),
             now.strftime("%H:%M"),
@@ -553,26 +1729,132 @@ class StudyTrackerApp(QtWidgets.QWidget):
             str(xp),
             str(time_studied)
         ]
-        self.data.append(session)
-        self.save_data()
-        self.subject_entry.setCurrentIndex(0)
+        self.data.extend(self.append_data([session]))
+        self.refresh_subject_choices()
         self.notes_entry.clear()
         self.xp_entry.clear()
         self.time_entry.clear()
         self.update_xp_display()
         self.refresh_log()
 
+    # --- Local Ingestion ---
+    def start_ingest_server(self):
+        self.ingest_queue = []
+        # Hold connected sockets here; the slot lambdas alone don't reliably keep them alive
+        self.ingest_sockets = set()
+        self.ingest_timer = QtCore.QTimer(self)
+        self.ingest_timer.setSingleShot(True)
+        self.ingest_timer.timeout.connect(self.flush_ingest_queue)
+        self.ingest_server = QtNetwork.QLocalServer(self)
+        self.ingest_server.setSocketOptions(QtNetwork.QLocalServer.UserAccessOption)
+        name = instance_key(self.data_dir)
+        # We hold the instance lock, so anything already bound to this name is left over from a crash
+        QtNetwork.QLocalServer.removeServer(name)
+        if not self.ingest_server.listen(name):
+            return
+        self.ingest_server.newConnection.connect(self.accept_ingest_connection)
+
+    def accept_ingest_connection(self):
+        while self.ingest_server.hasPendingConnections():
+            sock = self.ingest_server.nextPendingConnection()
+            self.ingest_sockets.add(sock)
+            sock.readyRead.connect(lambda sock=sock: self.read_ingest_socket(sock))
+            sock.disconnected.connect(lambda sock=sock: self.drop_ingest_socket(sock))
+            # Bytes that arrived before the signal was wired won't raise readyRead again
+            self.read_ingest_socket(sock)
+
+    def drop_ingest_socket(self, sock):
+        self.ingest_sockets.discard(sock)
+        sock.deleteLater()
+
+    def read_ingest_socket(self, sock):
+        while sock.canReadLine():
+            line = bytes(sock.readLine()).decode("utf-8", "replace").strip()
+            if not line:
+                continue
+            try:
+                kind, payload = self.parse_ingest_record(json.loads(line))
+            except (ValueError, TypeError, KeyError, OverflowError) as e:
+                sock.write((json.dumps({"ok": False, "error": str(e)}) + "\n").encode("utf-8"))
+                continue
+            if kind == "activate":
+                self.showNormal()
+                self.raise_()
+                self.activateWindow()
+            else:
+                self.ingest_queue.append((kind, payload))
+            sock.write(b'{"ok": true}\n')
+        if self.ingest_queue and not self.ingest_timer.isActive():
+            self.ingest_timer.start(INGEST_FLUSH_MS)
+
+    def parse_ingest_record(self, record):
+        if not isinstance(record, dict):
+            raise ValueError("record must be a JSON object")
+        kind = record.get("type")
+        if kind == "activate":
+            return kind, None
+        now = datetime.now()
+        date = record.get("date") or now.strftime("%Y-%m-%d")
+        time = record.get("time") or now.strftime("%H:%M")
+        datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+        if kind == "session":
+            subject = str(record["subject"]).strip()
+            if not subject:
+                raise ValueError("subject cannot be empty")
+            xp = ingest_int(record, "xp")
+            time_studied = ingest_int(record, "minutes")
+            notes = str(record.get("notes", "")).strip()
+            return kind, [date, time, subject, notes, str(xp), str(time_studied)]
+        if kind == "journal":
+            if "content" in record:
+                content = str(record["content"])
+            else:
+                content = html.escape(str(record["text"])).replace("\n", "<br>")
+            attachments = record.get("attachments") or []
+            if not isinstance(attachments, list):
+                raise ValueError("attachments must be a list of paths")
+            title = str(record.get("title") or "").strip() or None
+            return kind, JournalEntry(date, time, content, [str(a) for a in attachments], title)
+        raise ValueError(f"unknown record type: {kind!r}")
+
+    def flush_ingest_queue(self):
+        # Apply everything that arrived since the last flush with one write per file and one UI refresh
+        self.ingest_timer.stop()
+        if not self.ingest_queue:
+            return
+        sessions = [payload for kind, payload in self.ingest_queue if kind == "session"]
+        entries = [payload for kind, payload in self.ingest_queue if kind == "journal"]
+        self.ingest_queue = []
+        if sessions:
+            for session in sessions:
+                when = datetime.strptime(f"{session[0]} {session[1]}", "%Y-%m-%d %H:%M").timestamp()
+                session[2] = self.subject_catalog.record_use(session[2], when)["name"]
+            self.save_subjects()
+            self.data.extend(self.append_data(sessions))
+            self.refresh_subject_choices()
+            self.refresh_log()
+        if entries:
+            self.journal_entries.extend(entries)
+            self.save_journal()
+            # Rebuilding the tree drops the selection; don't let that wipe what's in the editor
+            self.journal_tree.blockSignals(True)
+            self.refresh_journal_list()
+            self.journal_tree.blockSignals(False)
+
     def refresh_log(self):
         filter_text = self.filter_entry.text().lower()
         self.table.setRowCount(0)
-        for session in self.data:
-            if filter_text in session[2].lower():
+        for data_index, session in enumerate(self.data):
+            # Show renamed subjects under their current name
+            subject = self.subject_catalog.display_name(session[2])
+            if filter_text in subject.lower():
                 row_pos = self.table.rowCount()
                 self.table.insertRow(row_pos)
                 for i, value in enumerate(session):
-                    item = QtWidgets.QTableWidgetItem(value)
-                    item.setForeground(QtGui.QColor(PASTEL_TEXT))
+                    item = QtWidgets.QTableWidgetItem(subject if i == 2 else value)
                     self.table.setItem(row_pos, i, item)
+                # Table rows only line up with self.data when nothing is filtered out
+                self.table.item(row_pos, 0).setData(QtCore.Qt.UserRole, data_index)
         self.update_xp_display()
 
     def update_xp_display(self):
@@ -584,37 +1866,37 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.xp_bar.setValue(xp_in_level)
 
     def sort_by_subject(self):
-        self.data.sort(key=lambda x: x[2].lower())
+        self.data.sort(key=lambda x: self.subject_catalog.display_name(x[2]).lower())
         self.refresh_log()
 
     def delete_selected(self):
         selected = self.table.selectionModel().selectedRows()
         if not selected:
             return
-        rows_to_delete = sorted([s.row() for s in selected], reverse=True)
+        rows_to_delete = sorted([self.table.item(s.row(), 0).data(QtCore.Qt.UserRole) for s in selected], reverse=True)
         for row in rows_to_delete:
             del self.data[row]
         self.save_data()
         self.refresh_log()
 
     def enlarge_notes(self, index):
-        row = index.row()
-        session = self.data[row]
-        notes = session[3]
-        dlg = QtWidgets.QDialog(self)
-        dlg.setWindowTitle(f"Notes for {session[2]} ({session[0]} {session[1]})")
-        dlg.setStyleSheet(f"background: {PASTEL_DARK_BG}; color: {PASTEL_TEXT};")
-        layout = QtWidgets.QVBoxLayout(dlg)
-        notes_edit = QtWidgets.QTextEdit()
-        notes_edit.setText(notes)
-        notes_edit.setReadOnly(True)
-        notes_edit.setFont(QtGui.QFont("Arial", 14))
-        layout.addWidget(notes_edit)
-        close_btn = QtWidgets.QPushButton("Close")
-        close_btn.clicked.connect(dlg.accept)
-        layout.addWidget(close_btn)
-        dlg.resize(600, 300)
-        dlg.exec_()
+        session = self.data[self.table.item(index.row(), 0).data(QtCore.Qt.UserRole)]
+        notes = self.session_notes(session)
+        # Built once and reused; only the text changes between rows
+        if self.notes_dialog is None:
+            self.notes_dialog = QtWidgets.QDialog(self)
+            layout = QtWidgets.QVBoxLayout(self.notes_dialog)
+            self.notes_view = QtWidgets.QTextEdit()
+            self.notes_view.setReadOnly(True)
+            self.notes_view.setFont(QtGui.QFont("Arial", 14))
+            layout.addWidget(self.notes_view)
+            close_btn = QtWidgets.QPushButton("Close")
+            close_btn.clicked.connect(self.notes_dialog.accept)
+            layout.addWidget(close_btn)
+        self.notes_dialog.setWindowTitle(f"Notes for {session[2]} ({session[0]} {session[1]})")
+        self.notes_view.setPlainText(notes)
+        self.notes_dialog.resize(600, 300)
+        self.notes_dialog.exec_()
 
     def show_graph(self):
         try:
@@ -671,20 +1953,28 @@ class StudyTrackerApp(QtWidgets.QWidget):
     def display_journal_entry(self):
         selected = self.journal_tree.selectedItems()
         if not selected:
-            self.journal_editor.clear()
-            self.attachment_label.setText("")
-            self.current_attachments = []
+            self.reset_journal_editor()
             return
         item = selected[0]
         # Only leaf nodes (entries) have UserRole data
         idx = item.data(0, QtCore.Qt.UserRole)
         if idx is None:
-            self.journal_editor.clear()
-            self.attachment_label.setText("")
-            self.current_attachments = []
+            self.reset_journal_editor()
             return
         entry = self.journal_entries[idx]
-        self.journal_editor.setHtml(entry.content)
+        cached = self.journal_docs.get(entry)
+        if cached is not None:
+            self.set_journal_document(cached[0], entry, cached[1])
+        else:
+            # Show an empty read-only editor until the worker hands the document back
+            self.reset_journal_editor()
+            self.journal_editor.setReadOnly(True)
+            self.journal_pending_entry = entry
+            self.prepare_journal_document(entry)
+        # Warm the neighbours so stepping through entries hits the cache
+        for neighbour in (idx - 1, idx + 1):
+            if 0 <= neighbour < len(self.journal_entries):
+                self.prepare_journal_document(self.journal_entries[neighbour])
         if entry.attachments:
             links = []
             for path in entry.attachments:
@@ -695,6 +1985,131 @@ class StudyTrackerApp(QtWidgets.QWidget):
             self.attachment_label.setText("")
         self.current_attachments = entry.attachments[:]
 
+    def prepare_journal_document(self, entry):
+        if entry in self.journal_preparing or self.journal_docs.get(entry) is not None:
+            return
+        self.journal_preparing.add(entry)
+        width = self.journal_editor.viewport().width()
+        self.journal_doc_pool.start(JournalDocumentJob(entry, self.journal_editor.font(), width, self.journal_doc_signals))
+
+    def journal_document_ready(self, entry, content, doc, shadow):
+        self.journal_preparing.discard(entry)
+        self.journal_docs.put(entry, content, doc, shadow)
+        if entry is self.journal_pending_entry and content is entry.content:
+            self.journal_pending_entry = None
+            self.set_journal_document(doc, entry, shadow)
+
+    def set_journal_document(self, doc, entry=None, shadow=None, keep_draft=False):
+        # A cached document the user typed into no longer matches its entry, so stop serving it
+        if self.journal_shown_entry is not None and self.journal_shown_doc.revision() != self.journal_shown_revision:
+            self.journal_docs.discard(self.journal_shown_entry)
+        self.journal_shown_doc.contentsChange.disconnect(self.journal_contents_changed)
+        # Moving off a document abandons its draft, unless the new document is the recovered draft
+        self.draft_idle_timer.stop()
+        self.draft_max_timer.stop()
+        self.draft_span = None
+        self.draft_shadow = shadow
+        self.draft_deltas = 0
+        self.draft_session += 1
+        if not keep_draft:
+            self.draft_pool.start(self.journal_draft.discard)
+        self.journal_editor.setDocument(doc)
+        self.journal_editor.setReadOnly(False)
+        self.journal_shown_doc = doc
+        self.journal_shown_entry = entry
+        self.journal_shown_revision = doc.revision()
+        # The log's base is only written once there is something to log; a kept log has one already
+        self.draft_base = None if keep_draft else entry.content if entry is not None else ""
+        doc.contentsChange.connect(self.journal_contents_changed)
+
+    # --- Journal Draft Autosave ---
+    def journal_contents_changed(self, position, removed, added):
+        # Only widen the pending span here; its text is serialized when the timer fires
+        if self.draft_span is None:
+            self.draft_span = (position, position + added, removed)
+        else:
+            start, end, logged = self.draft_span
+            low, high = min(start, position), max(end, position + removed)
+            self.draft_span = (low, high + added - removed, logged + (high - low) - (end - start))
+        self.draft_idle_timer.start(DRAFT_IDLE_MS)
+        if not self.draft_max_timer.isActive():
+            self.draft_max_timer.start(DRAFT_MAX_DELAY_MS)
+
+    def flush_journal_draft(self):
+        self.draft_idle_timer.stop()
+        self.draft_max_timer.stop()
+        if self.draft_span is None:
+            return
+        if self.draft_shadow is None:
+            # The span stays pending; journal_draft_shadow_ready flushes it once the shadow is back
+            return
+        if self.draft_base is not None:
+            base = self.draft_base
+            self.draft_base = None
+            self.draft_pool.start(lambda: self.journal_draft.compact(html=sanitize_journal_html(base)))
+        start, end, logged = self.draft_span
+        self.draft_span = None
+        doc = self.journal_shown_doc
+        # Qt counts the closing paragraph break in its ranges, which no cursor can reach
+        start = min(start, doc.characterCount() - 1)
+        end = min(end, doc.characterCount() - 1)
+        logged = min(start + logged, self.draft_shadow.characterCount() - 1) - start
+        start, end, logged = trim_draft_span(doc, self.draft_shadow, start, end, logged)
+        blocks = draft_delta_blocks(doc, start, end)
+        # Replay the delta on the shadow and check the blocks it touched; whatever it can't
+        # reproduce (tables, say) gets logged as a full snapshot instead
+        apply_draft_delta(self.draft_shadow, start, logged, blocks)
+        if self.draft_shadow.characterCount() != doc.characterCount() or draft_region(self.draft_shadow, start, end) != draft_region(doc, start, end):
+            snapshot = doc.clone()
+            # clone() copies through a fragment, which leaves out the first block's formats and list
+            apply_draft_delta(snapshot, 0, 0, draft_delta_blocks(doc, 0, 0))
+            self.queue_draft_shadow(doc=snapshot)
+            return
+        self.draft_pool.start(lambda: self.journal_draft.append(start, logged, blocks))
+        self.draft_deltas += 1
+        if self.draft_deltas >= DRAFT_COMPACT_DELTAS:
+            self.queue_draft_shadow(doc=self.draft_shadow)
+
+    def queue_draft_shadow(self, doc=None):
+        self.draft_shadow = None
+        self.draft_deltas = 0
+        if doc is not None:
+            # Let the pool thread take it over
+            doc.moveToThread(None)
+        self.draft_pool.start(DraftShadowJob(self.journal_draft, self.draft_session, doc, self.journal_editor.font(), self.draft_signals))
+
+    def journal_draft_shadow_ready(self, session, doc):
+        # Drop shadows for a document that is no longer shown
+        if session != self.draft_session:
+            return
+        self.draft_shadow = doc
+        if self.draft_span is not None:
+            self.flush_journal_draft()
+
+    def restore_journal_draft(self):
+        doc = QtGui.QTextDocument()
+        doc.setDefaultFont(self.journal_editor.font())
+        if not self.journal_draft.replay(doc):
+            self.journal_draft.discard()
+            return
+        self.set_journal_document(doc, keep_draft=True)
+        # The shadow is replayed from the log too, so it matches the editor exactly
+        self.queue_draft_shadow()
+        self.tabs.setCurrentIndex(1)
+        QtWidgets.QMessageBox.information(self, "Draft Recovered", "Your unsaved journal text from last time has been restored.")
+
+    def reset_journal_editor(self):
+        # Swap in a blank document rather than clearing, which would wipe a cached one
+        self.journal_pending_entry = None
+        # Unparented, so it is freed once neither the editor nor journal_shown_doc holds it
+        doc = QtGui.QTextDocument()
+        doc.setDefaultFont(self.journal_editor.font())
+        shadow = QtGui.QTextDocument()
+        shadow.setDefaultFont(self.journal_editor.font())
+        self.set_journal_document(doc, shadow=shadow)
+        self.attachment_label.setText("")
+        self.current_attachments = []
+
     def add_journal_entry(self):
         content = self.journal_editor.toHtml()
         now = datetime.now()
@@ -705,9 +2120,7 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.journal_entries.append(entry)
         self.save_journal()
         self.refresh_journal_list()
-        self.journal_editor.clear()
-        self.attachment_label.setText("")
-        self.current_attachments = []
+        self.reset_journal_editor()
 
     def delete_journal_entry(self):
         selected = self.journal_tree.selectedItems()
@@ -716,12 +2129,11 @@ class StudyTrackerApp(QtWidgets.QWidget):
         item = selected[0]
         idx = item.data(0, QtCore.Qt.UserRole)
         if idx is not None and 0 <= idx < len(self.journal_entries):
+            self.journal_docs.discard(self.journal_entries[idx])
             del self.journal_entries[idx]
             self.save_journal()
             self.refresh_journal_list()
-            self.journal_editor.clear()
-            self.attachment_label.setText("")
-            self.current_attachments = []
+            self.reset_journal_editor()
 
     def rename_journal_entry(self):
         selected = self.journal_tree.selectedItems()
@@ -752,24 +2164,26 @@ class StudyTrackerApp(QtWidgets.QWidget):
         self.journal_editor.setTextCursor(cursor)
 
     def open_settings_window(self):
+        self.build_settings_dialog().exec_()
+
+    def build_settings_dialog(self):
         dlg = QtWidgets.QDialog(self)
         dlg.setWindowTitle("Settings")
-        dlg.setStyleSheet(f"background: {PASTEL_DARK_BG}; color: {PASTEL_TEXT};")
         layout = QtWidgets.QVBoxLayout(dlg)
         # Data folder section
         folder_group = QtWidgets.QGroupBox()
         folder_group.setTitle("")
-        folder_group.setStyleSheet(f"QGroupBox {{background: {PASTEL_DARK_PANEL}; border-radius: 8px; margin-top: 12px; border: none;}}")
+        folder_group.setObjectName("settingsSection")
         folder_layout = QtWidgets.QGridLayout(folder_group)
         folder_label_lbl = QtWidgets.QLabel("Data Folder:")
-        folder_label_lbl.setStyleSheet(f"color: {PASTEL_TEXT}; font-size: 15px; padding-right: 8px;")
+        folder_label_lbl.setObjectName("settingName")
         folder_layout.addWidget(folder_label_lbl, 0, 0, QtCore.Qt.AlignLeft)
         folder_label = QtWidgets.QLineEdit(self.data_dir)
         folder_label.setReadOnly(True)
-        folder_label.setStyleSheet(f"background: {PASTEL_DARK_BG}; color: {PASTEL_GREEN}; font-size: 15px; border: none; padding: 6px 8px; border-radius: 6px;")
+        folder_label.setObjectName("settingValue")
         folder_layout.addWidget(folder_label, 0, 1)
         change_btn = QtWidgets.QPushButton("Change...")
-        change_btn.setStyleSheet(f"background: {PASTEL_ACCENT}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; font-size: 15px; padding: 6px 16px;")
+        style_button(change_btn, "accent", "large")
         def change_folder():
             folder = QtWidgets.QFileDialog.getExistingDirectory(self, "Select New Data Folder", self.data_dir)
             if folder:
@@ -782,18 +2196,18 @@ class StudyTrackerApp(QtWidgets.QWidget):
         # Alarm sound section
         alarm_group = QtWidgets.QGroupBox()
         alarm_group.setTitle("")
-        alarm_group.setStyleSheet(f"QGroupBox {{background: {PASTEL_DARK_PANEL}; border-radius: 8px; margin-top: 12px; border: none;}}")
+        alarm_group.setObjectName("settingsSection")
         alarm_layout = QtWidgets.QGridLayout(alarm_group)
         alarm_label_lbl = QtWidgets.QLabel("Break Timer Alarm Sound:")
-        alarm_label_lbl.setStyleSheet(f"color: {PASTEL_TEXT}; font-size: 15px; padding-right: 8px;")
+        alarm_label_lbl.setObjectName("settingName")
         alarm_layout.addWidget(alarm_label_lbl, 0, 0, QtCore.Qt.AlignLeft)
         alarm_basename = os.path.basename(self.alarm_path) if self.alarm_path else "(System Beep)"
         alarm_label = QtWidgets.QLineEdit(alarm_basename)
         alarm_label.setReadOnly(True)
-        alarm_label.setStyleSheet(f"background: {PASTEL_DARK_BG}; color: {PASTEL_GREEN}; font-size: 15px; border: none; padding: 6px 8px; border-radius: 6px;")
+        alarm_label.setObjectName("settingValue")
         alarm_layout.addWidget(alarm_label, 0, 1)
         choose_alarm_btn = QtWidgets.QPushButton("Choose Sound")
-        choose_alarm_btn.setStyleSheet(f"background: {PASTEL_ACCENT}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; font-size: 15px; padding: 6px 16px;")
+        style_button(choose_alarm_btn, "accent", "large")
         def choose_alarm():
             file, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Choose Alarm Sound", self.data_dir, "Audio Files (*.wav *.mp3 *.ogg)")
             if file:
@@ -805,17 +2219,147 @@ class StudyTrackerApp(QtWidgets.QWidget):
         choose_alarm_btn.clicked.connect(choose_alarm)
         alarm_layout.addWidget(choose_alarm_btn, 0, 2)
         layout.addWidget(alarm_group)
+        # Theme section
+        theme_group = QtWidgets.QGroupBox()
+        theme_group.setObjectName("settingsSection")
+        theme_layout = QtWidgets.QGridLayout(theme_group)
+        theme_label_lbl = QtWidgets.QLabel("Theme:")
+        theme_label_lbl.setObjectName("settingName")
+        theme_layout.addWidget(theme_label_lbl, 0, 0, QtCore.Qt.AlignLeft)
+        theme_box = QtWidgets.QComboBox()
+        theme_box.setObjectName("settingValue")
+        theme_box.addItems(list(THEMES))
+        theme_box.setCurrentText(self.theme_name)
+        def choose_theme(name):
+            self.apply_theme(name)
+            config = load_config() or {}
+            config["theme"] = name
+            save_config(config)
+        theme_box.currentTextChanged.connect(choose_theme)
+        theme_layout.addWidget(theme_box, 0, 1)
+        theme_layout.setColumnStretch(1, 1)
+        layout.addWidget(theme_group)
         # Close button
         close_btn = QtWidgets.QPushButton("Close")
-        close_btn.setStyleSheet(f"background: {PASTEL_PURPLE}; color: {PASTEL_DARK_BG}; font-weight: bold; border-radius: 6px; font-size: 15px; padding: 6px 24px;")
+        style_button(close_btn, "purple", "wide")
         close_btn.setFixedWidth(120)
         close_btn.clicked.connect(dlg.accept)
         layout.addWidget(close_btn, alignment=QtCore.Qt.AlignRight)
         dlg.setLayout(layout)
         dlg.setMinimumWidth(480)
-        dlg.exec_()
+        return dlg
+
+def run_verify(data_dir, repair):
+    if not os.path.isdir(data_dir):
+        print(f"No data folder at {data_dir}", file=sys.stderr)
+        return 1
+    if repair:
+        # Repairs rewrite the files, so they must not race a running app
+        lock = QtCore.QLockFile(instance_lock_path(data_dir))
+        lock.setStaleLockTime(0)
+        if not lock.tryLock(0):
+            if lock.error() == QtCore.QLockFile.LockFailedError:
+                print("Goated Study Tracker is running for this folder; close it first or pass --no-repair", file=sys.stderr)
+            else:
+                # Permission or I/O trouble creating the lock file, not another process holding it
+                print(f"Could not create the lock file in {data_dir}, so nothing was repaired; pass --no-repair to only check", file=sys.stderr)
+            return 1
+    status = 0
+    for path, headers, check_row in data_file_specs(data_dir):
+        name = os.path.basename(path)
+        report = verify_data_file(path, headers, check_row, repair=repair)
+        print(f"{name}: {report['rows']} rows, {report['bad']} malformed (re-checked {report['checked_bytes']} bytes, {report['skipped_bytes']} unchanged)")
+        for offset, reason in report["problems"]:
+            print(f"  byte {offset}: {reason}")
+        if report["recovery_file"]:
+            print(f"  malformed rows moved to {report['recovery_file']}")
+        if report["bad"] and not report["repaired"]:
+            status = 2
+    if repair:
+        lock.unlock()
+    return status
+
+def run_profile_ui(runs):
+    # Times building and first showing the main window and the settings dialog, styles included.
+    # The window's data loading and startup checks are left out by timing init_ui on its own.
+    import statistics
+    import tempfile
+    app = QtWidgets.QApplication(sys.argv[:1])
+    times = {"main window init_ui": [], "main window first show": [], "settings dialog build": [], "settings dialog first show": []}
+
+    class ProfiledApp(StudyTrackerApp):
+        def init_ui(self):
+            start = time.perf_counter()
+            super().init_ui()
+            times["main window init_ui"].append(time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        for _ in range(runs):
+            window = ProfiledApp(data_dir=data_dir)
+            start = time.perf_counter()
+            window.show()
+            app.processEvents()
+            times["main window first show"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            dlg = window.build_settings_dialog()
+            times["settings dialog build"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            dlg.show()
+            app.processEvents()
+            times["settings dialog first show"].append(time.perf_counter() - start)
+            dlg.close()
+            window.close()
+            window.deleteLater()
+            # processEvents() leaves deferred deletes alone, and the window's ingest server socket with them
+            app.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+    for name, samples in times.items():
+        print(f"{name}: median {statistics.median(samples) * 1000:.1f} ms over {runs} runs")
+    return 0
+
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="goatedstudytracker", description="Command-line tools for Goated Study Tracker.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--data-dir", help="data folder of the running app (default: the configured folder)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    log_parser = sub.add_parser("log", parents=[common], help="log a study session")
+    log_parser.add_argument("subject")
+    log_parser.add_argument("--xp", type=int, required=True)
+    log_parser.add_argument("--minutes", type=int, required=True)
+    log_parser.add_argument("--notes", default="")
+    journal_parser = sub.add_parser("journal", parents=[common], help="add a journal entry")
+    journal_parser.add_argument("text", help="entry text, or - to read it from stdin")
+    journal_parser.add_argument("--title")
+    journal_parser.add_argument("--html", action="store_true", help="treat the text as rich text HTML")
+    journal_parser.add_argument("--attach", action="append", default=[], help="attachment path (repeatable)")
+    verify_parser = sub.add_parser("verify", parents=[common], help="check the data files and quarantine malformed rows")
+    verify_parser.add_argument("--no-repair", action="store_true", help="only report problems, leave the files untouched")
+    profile_parser = sub.add_parser("profile-ui", help="time main window and settings dialog construction")
+    profile_parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+    if args.command == "profile-ui":
+        return run_profile_ui(args.runs)
+    data_dir = args.data_dir or (load_config() or {}).get("data_dir") or get_default_data_dir()
+    if args.command == "verify":
+        return run_verify(data_dir, repair=not args.no_repair)
+    if args.command == "log":
+        record = {"type": "session", "subject": args.subject, "xp": args.xp, "minutes": args.minutes, "notes": args.notes}
+    else:
+        text = sys.stdin.read() if args.text == "-" else args.text
+        record = {"type": "journal", "title": args.title, "attachments": [os.path.abspath(a) for a in args.attach]}
+        record["content" if args.html else "text"] = text
+    app = QtCore.QCoreApplication(sys.argv[:1])
+    replies = send_ingest_records(data_dir, [record])
+    if replies is None:
+        print(f"Goated Study Tracker is not running for {data_dir}", file=sys.stderr)
+        return 1
+    if not replies or not replies[0].get("ok"):
+        print(replies[0].get("error", "no reply") if replies else "no reply", file=sys.stderr)
+        return 1
+    return 0
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS:
+        sys.exit(run_cli(sys.argv[1:]))
     app = QtWidgets.QApplication(sys.argv)
     window = StudyTrackerApp()
     window.show()
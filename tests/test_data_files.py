@@ -0,0 +1,60 @@
+import base64
+import os
+import types
+
+import pytest
+
+# The app imports QtMultimedia, which needs system audio libraries to load
+pytest.importorskip("PyQt5.QtMultimedia", exc_type=ImportError)
+import goatedstudytracker as gst
+
+# Bigger than csv's default 128 KiB field limit
+LARGE_FIELD = 200 * 1024
+
+
+def large_entries():
+    image = base64.b64encode(os.urandom(LARGE_FIELD)).decode("ascii")
+    return [
+        # Quoted by csv: the HTML has quotes in it
+        gst.JournalEntry("2026-01-02", "10:00", f'<p>diagram</p><img src="data:image/png;base64,{image}">', [], "Diagram"),
+        # Left unquoted: nothing in it needs escaping
+        gst.JournalEntry("2026-01-03", "11:00", "x" * LARGE_FIELD, [], "Plain"),
+    ]
+
+
+def test_large_journal_entries_survive_save_and_load(tmp_path):
+    app = types.SimpleNamespace(JOURNAL_FILE=str(tmp_path / "journal_entries.csv"), journal_entries=large_entries())
+    gst.StudyTrackerApp.save_journal(app)
+    loaded = gst.StudyTrackerApp.load_journal(app)
+    assert [(e.date, e.time, e.content, e.title) for e in loaded] == [(e.date, e.time, e.content, e.title) for e in app.journal_entries]
+
+
+def test_integrity_check_keeps_large_journal_entry(tmp_path):
+    app = types.SimpleNamespace(JOURNAL_FILE=str(tmp_path / "journal_entries.csv"), journal_entries=large_entries())
+    gst.StudyTrackerApp.save_journal(app)
+    report = gst.verify_data_file(app.JOURNAL_FILE, [gst.JOURNAL_HEADER], gst.check_journal_row)
+    assert report["bad"] == 0 and report["rows"] == 2
+    assert not (tmp_path / "journal_entries.recovered.csv").exists()
+
+
+def write_session_log(path, lines):
+    rows = [f"2024-01-0{day},10:00,Physics,row {day},10,5\r\n" for day in range(3, 8)]
+    path.write_bytes(("Date,Time,Subject,Notes,XP,Time Studied (min)\r\n" + "".join(lines + rows)).encode("utf-8"))
+
+
+def test_stray_quote_inside_a_field_is_not_malformed(tmp_path):
+    path = tmp_path / "study_log.csv"
+    write_session_log(path, ['2024-01-02,10:00,Physics,12" ruler,10,5\r\n'])
+    report = gst.verify_data_file(str(path), [gst.SESSION_HEADER], gst.check_session_row)
+    assert report["bad"] == 0 and report["rows"] == 6
+
+
+def test_unterminated_quote_only_moves_its_own_line(tmp_path):
+    path = tmp_path / "study_log.csv"
+    broken = '2024-01-02,10:00,"Physics,10,5\r\n'
+    write_session_log(path, [broken])
+    report = gst.verify_data_file(str(path), [gst.SESSION_HEADER], gst.check_session_row)
+    assert report["bad"] == 1 and report["repaired"]
+    assert (tmp_path / "study_log.recovered.csv").read_bytes() == broken.encode("utf-8")
+    recheck = gst.verify_data_file(str(path), [gst.SESSION_HEADER], gst.check_session_row)
+    assert recheck["bad"] == 0 and recheck["rows"] == 5